@@ -1,5 +1,32 @@
 var dagcomponentfuncs = (window.dashAgGridComponentFunctions = window.dashAgGridComponentFunctions || {});
 
+// bar charts of the top 5 sectors, built from the numeric series of the row and kept per ETF and data,
+// so the grid data only carries the series and a chart is only built again when they change
+const sectorFigures = new Map();
+
+function sectorFigure(ticker, sectors, navs) {
+    const key = `${ticker}|${sectors.join(",")}|${navs.join(",")}`;
+    if (!sectorFigures.has(key)) {
+        sectorFigures.set(key, {
+            data: [{
+                type: "bar",
+                x: sectors,
+                y: navs,
+                name: "",
+                marker: { color: "#636efa" },
+                hovertemplate: "Sector=%{x}<br>%NAV=%{y}<extra></extra>",
+            }],
+            layout: {
+                showlegend: false,
+                xaxis: { visible: false, showticklabels: false },
+                yaxis: { visible: false, showticklabels: false, range: [0, 100] },
+                margin: { l: 0, r: 0, t: 0, b: 0 },
+            },
+        });
+    }
+    return sectorFigures.get(key);
+}
+
 dagcomponentfuncs.DCC_GraphClickData = function (props) {
     const {setData} = props;
     function setProps() {
@@ -8,8 +35,9 @@ dagcomponentfuncs.DCC_GraphClickData = function (props) {
             setData(graphProps);
         }
     }
-    const sectors = props.value.data[0].x
-    const navs = props.value.data[0].y
+    const sectors = props.data["Top 5 Sector"]
+    const navs = props.data["Top 5 %NAV"]
+    const figure = sectorFigure(props.data["Ticker"], sectors, navs)
 
     const labels = sectors.map((sector, ind) => {
         const nav = navs[ind]
@@ -28,7 +56,7 @@ dagcomponentfuncs.DCC_GraphClickData = function (props) {
         { className: "flex flex-col h-full" },
         [
             React.createElement(window.dash_core_components.Graph, {
-                figure: props.value,
+                figure: figure,
                 setProps,
                 style: { width: '100%', height: '150px', marginBottom: "4px" },
                 config: {displayModeBar: false},
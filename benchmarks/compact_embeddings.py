@@ -0,0 +1,98 @@
+# Benchmark of the compact embedding store (pages/compact_embeddings.py) against the full fastText model:
+# startup time and peak RSS of loading each model, and agreement of the constituent rankings they produce.
+# Run from the home directory of the repo once the compact store is built:
+#     python -m benchmarks.compact_embeddings [path to cc.en.300.bin]
+import sys
+import json
+import time
+import resource
+import subprocess
+import numpy as np
+import pandas as pd
+
+QUERIES = ["semiconductor", "artificial intelligence", "clean energy", "healthcare", "banking", "oil and gas",
+           "electric vehicles", "cloud software", "biotechnology", "real estate", "cybersecurity", "gold miners"]
+ETFS = ["JEPI", "JEPQ", "JQUA", "QQQ", "DFAC"]
+TOP_N = 10
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def load(kind, model_path):
+    """Load a model in this process and report how long it took and the peak RSS"""
+    start = time.perf_counter()
+    if kind == 'full':
+        import fasttext
+        model = fasttext.load_model(model_path)
+    else:
+        from pages.compact_embeddings import CompactEmbeddings
+        model = CompactEmbeddings()
+    model.get_sentence_vector(QUERIES[0])
+    print(json.dumps({'seconds': time.perf_counter() - start, 'rss_mb': peak_rss_mb()}))
+
+
+def measure_startup(kind, model_path):
+    # Each model is loaded in a fresh interpreter so the measurements do not include each other
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.compact_embeddings', '--load', kind, model_path],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().split('\n')[-1])
+
+
+def description_matrix(model, descriptions):
+    matrix = np.array([model.get_sentence_vector(description) for description in descriptions])
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+def similarities(model, matrix, query):
+    query_vector = model.get_sentence_vector(query)
+    return matrix @ (query_vector / max(np.linalg.norm(query_vector), 1e-12))
+
+
+def spearman(a, b):
+    rank_a = np.argsort(np.argsort(a))
+    rank_b = np.argsort(np.argsort(b))
+    return np.corrcoef(rank_a, rank_b)[0, 1]
+
+
+def ranking_agreement(model_path):
+    import fasttext
+    from pages.compact_embeddings import CompactEmbeddings
+    from pages.constituent_data import load_constituents
+
+    full_model = fasttext.load_model(model_path)
+    compact_model = CompactEmbeddings()
+
+    rows = []
+    for etf in ETFS:
+        descriptions = load_constituents(etf).dropna()['Clean Description'].tolist()
+        full_matrix = description_matrix(full_model, descriptions)
+        compact_matrix = description_matrix(compact_model, descriptions)
+        for query in QUERIES:
+            full_sim = similarities(full_model, full_matrix, query)
+            compact_sim = similarities(compact_model, compact_matrix, query)
+            top_full = set(np.argsort(-full_sim)[:TOP_N])
+            top_compact = set(np.argsort(-compact_sim)[:TOP_N])
+            rows.append({'ETF': etf, 'Query': query, 'Spearman': spearman(full_sim, compact_sim),
+                         f'Top {TOP_N} overlap': len(top_full & top_compact) / TOP_N})
+
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--load':
+        load(sys.argv[2], sys.argv[3])
+        sys.exit()
+
+    model_path = sys.argv[1] if len(sys.argv) > 1 else 'cc.en.300.bin'
+
+    for kind in ['full', 'compact']:
+        startup = measure_startup(kind, model_path)
+        print(f"{kind:>8} model: startup {startup['seconds']:.2f} s, peak RSS {startup['rss_mb']:.0f} MB")
+
+    results = ranking_agreement(model_path)
+    print(results.to_string(index=False))
+    print(f"Mean Spearman: {results['Spearman'].mean():.4f}, mean top {TOP_N} overlap: {results[f'Top {TOP_N} overlap'].mean():.2%}")
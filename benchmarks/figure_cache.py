@@ -0,0 +1,67 @@
+# Latency and payload of the scatter plot of the Competitor Analysis page (pages/feature2.py) for 5, 20 and 100 ETFs
+# shown and one more selected: the figure built with Plotly Express on every update (previous approach) against the
+# figure served from the FigureCache (pages/figure_cache.py), and the whole figure sent on a change of selection against
+# the patch of its traces (the ETF added is first in the order of the traces, the worst case: every other trace moves and
+# is recolored).
+# Run from the home directory of the repo:
+#     python -m benchmarks.figure_cache
+import json
+import time
+import numpy as np
+import pandas as pd
+import plotly.express as px
+from dash import Patch
+from pages.data_access import read_workbook
+from pages.figure_cache import FigureCache, trace_patch
+
+SIZES = [5, 20, 100]
+REPEATS = 5
+SEED = 0
+
+
+def build_figure(df, x_variable, y_variable, tickers):
+    """The scatter plot as built by update_graph"""
+    return px.scatter(
+        df[df["Ticker"].isin(tickers)].sort_values("Ticker", kind="stable"),
+        x=x_variable,
+        y=y_variable,
+        color="Ticker",
+    ).update_layout(
+        xaxis_title=x_variable,
+        yaxis_title=y_variable,
+        margin={"t":0,"b":0},
+    )
+
+
+def timed(function):
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return result, np.median(times) * 1000
+
+
+if __name__ == "__main__":
+    df = read_workbook("./static/Competitor Data_v2.xlsx", sheet_name="Competitor Data")
+    x_variable, y_variable = df.columns[9], df.columns[10]
+    cache = FigureCache()
+    rng = np.random.default_rng(SEED)
+    # Warm up: Plotly's figure validators
+    build_figure(df, x_variable, y_variable, list(df["Ticker"][:2])).to_json()
+
+    results = []
+    for n in SIZES:
+        tickers = sorted(rng.choice(df["Ticker"].unique(), size=n + 1, replace=False))
+        shown, selected = tickers[1:], tickers
+        _, build_ms = timed(lambda: build_figure(df, x_variable, y_variable, selected).to_json())
+        key = (x_variable, y_variable, tuple(selected))
+        figure = cache.get(key, lambda: build_figure(df, x_variable, y_variable, selected))
+        _, cached_ms = timed(lambda: json.dumps(cache.get(key, None)))
+
+        patch = Patch()
+        trace_patch(patch["props"]["figure"]["data"], shown, figure["data"])
+        results.append({"ETFs": n + 1, "Build (ms)": build_ms, "Cached (ms)": cached_ms,
+                        "Figure (KB)": len(json.dumps(figure).encode()) / 1024,
+                        "Patch (KB)": len(json.dumps(patch.to_plotly_json()).encode()) / 1024})
+    print(pd.DataFrame(results).to_string(index=False, float_format="{:.1f}".format))
@@ -0,0 +1,55 @@
+# Latency of the comparison of an ETF with its competitors on the Competitor Analysis page (pages/feature2.py) for 1, 10
+# and 500 competitors: the previous find_advantage (cleaning the data on every selection, then a scan of the data per
+# competitor) against the precomputed CompetitorMatrix (pages/feature2_backend.py), which also checks both agree.
+# Run from the home directory of the repo:
+#     python -m benchmarks.find_advantage
+import time
+import numpy as np
+import pandas as pd
+from pages.data_access import read_workbook
+from pages.feature2_backend import CompetitorMatrix, clean_competitor_data
+
+SIZES = [1, 10, 500]
+ETF = "JEPI US Equity"
+REPEATS = 5
+SEED = 0
+
+
+def previous_find_advantage(df, x1, x2):
+    """find_advantage as it was, one boolean scan of the data per competitor"""
+    etf1 = df[df['Ticker'] == x1].iloc[0][1:]
+    etf1 = etf1[8:].astype(float)
+
+    advantages = {}
+    for competitor in x2:
+        etf2 = df[df['Ticker'] == competitor].iloc[0][1:]
+        etf2 = etf2[8:].astype(float)
+        diff = ((etf1 - etf2) / etf1) * 100
+        advantages[competitor] = diff.round(2)
+    return advantages
+
+
+def timed(function):
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return result, np.median(times) * 1000
+
+
+if __name__ == "__main__":
+    df = read_workbook("./static/Competitor Data_v2.xlsx", sheet_name="Competitor Data")
+    matrix, build_ms = timed(lambda: CompetitorMatrix(clean_competitor_data(df)))
+    print(f"Competitor matrix: {matrix.values.shape[0]} ETFs x {matrix.values.shape[1]} metrics, built in {build_ms:.1f} ms")
+
+    rng = np.random.default_rng(SEED)
+    tickers = df.loc[df["Ticker"] != ETF, "Ticker"].to_numpy()
+    results = []
+    for n in SIZES:
+        competitors = list(rng.choice(tickers, size=n, replace=False))
+        previous, previous_ms = timed(lambda: previous_find_advantage(clean_competitor_data(df), ETF, competitors))
+        advantages, matrix_ms = timed(lambda: matrix.advantages(ETF, competitors))
+        same = all(np.array_equal(previous[c].to_numpy(dtype=float), advantages[c].to_numpy(), equal_nan=True) for c in competitors)
+        results.append({"Competitors": n, "Previous (ms)": previous_ms, "Matrix (ms)": matrix_ms, "Same result": same})
+    print(pd.DataFrame(results).to_string(index=False, float_format="{:.2f}".format))
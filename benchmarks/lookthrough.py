@@ -0,0 +1,61 @@
+# Latency of the holdings look-through (pages/lookthrough.py): sector exposure of client portfolios by sparse matrix
+# products against a pandas merge of every portfolio with the holdings of its ETFs. Besides the clients of
+# 'Client ETF Holdings.xlsx' (which mostly hold ETFs without holdings files), random portfolios of the ETFs with holdings
+# are looked through.
+# Run from the home directory of the repo:
+#     python -m benchmarks.lookthrough
+import time
+import numpy as np
+import pandas as pd
+from pages.constituent_data import load_holdings
+from pages.data_access import read_workbook
+from pages.lookthrough import LookThrough, etf_ticker
+
+SIZES = [10, 100, 1000]
+SEED = 0
+
+
+def random_portfolios(etfs, n, rng):
+    portfolios = {}
+    for i in range(n):
+        held = rng.choice(etfs, size=rng.integers(1, len(etfs) + 1), replace=False)
+        portfolios[f"Portfolio {i}"] = pd.DataFrame({"Ticker": held, "Weight": rng.dirichlet(np.ones(len(held)))})
+    return portfolios
+
+
+def merge_exposure(portfolios, holdings):
+    """Sector exposure by merging each portfolio with the positions of its ETFs"""
+    exposures = {}
+    for name, portfolio in portfolios.items():
+        portfolio = portfolio.assign(ETF=portfolio["Ticker"].map(etf_ticker))
+        positions = portfolio.merge(holdings, on="ETF")
+        positions["Exposure"] = positions["Weight_x"] * positions["Weight_y"] / 100
+        exposures[name] = positions.groupby("Sector")["Exposure"].sum()
+    return pd.DataFrame(exposures).T.fillna(0)
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, (time.perf_counter() - start) * 1000
+
+
+if __name__ == "__main__":
+    lookthrough, build_ms = timed(LookThrough.build)
+    print(f"Look-through matrix: {len(lookthrough.etfs)} ETFs x {len(lookthrough.securities)} securities, "
+          f"{lookthrough.weights.nnz} positions, built in {build_ms:.0f} ms")
+    lookthrough.group_matrix("Sector")
+    holdings = pd.concat([load_holdings(etf).assign(ETF=etf) for etf in lookthrough.etfs], ignore_index=True)
+
+    rng = np.random.default_rng(SEED)
+    cases = [("Clients", read_workbook("./static/Client ETF Holdings.xlsx", sheet_name=None))]
+    cases += [(f"{n} random", random_portfolios(lookthrough.etfs, n, rng)) for n in SIZES]
+
+    results = []
+    for name, portfolios in cases:
+        sparse_exposure, sparse_ms = timed(lambda: lookthrough.group_exposure(portfolios))
+        merge_exposure_df, merge_ms = timed(lambda: merge_exposure(portfolios, holdings))
+        merged = merge_exposure_df.reindex(index=sparse_exposure.index, columns=sparse_exposure.columns).fillna(0)
+        results.append({"Portfolios": name, "Sparse (ms)": sparse_ms, "Merge (ms)": merge_ms,
+                        "Max difference": np.abs(merged.to_numpy() - sparse_exposure.to_numpy()).max()})
+    print(pd.DataFrame(results).to_string(index=False, float_format="{:.3g}".format))
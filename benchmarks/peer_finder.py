@@ -0,0 +1,57 @@
+# Latency of the nearest competitors of the JPM ETFs (pages/peer_finder.py) over every fund of Competitor Data_v2.xlsx:
+# a distance to every fund, sorted (brute force), against the KD-tree query of the PeerFinder, which also checks both
+# find competitors at the same distances. Times are of the search only, not of the table of distance contributions.
+# Run from the home directory of the repo:
+#     python -m benchmarks.peer_finder
+import time
+import numpy as np
+import pandas as pd
+from pages.data_access import read_workbook
+from pages.peer_finder import PeerFinder
+
+REGIONS = ["US Equity", "MM Equity", "CN Equity", "BH Equity", "TP Equity"]
+EXCLUDED_COLUMNS = ["North", "Name", "Primary Exchange", "Ticker", "Parent Comp. Name", "Fund Objective",
+                    "Fund Geographical Focus", "Fund Asset Class Focus", "General Attribute"]
+SIZES = [5, 20]
+REPEATS = 5
+
+
+def brute_force(finder, position, k):
+    distances = np.sqrt(((finder.values - finder.values[position]) ** 2).sum(axis=1))
+    distances[position] = np.inf
+    return np.argsort(distances, kind="stable")[:k]
+
+
+def timed(function):
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return result, np.median(times) * 1000
+
+
+if __name__ == "__main__":
+    sheets = read_workbook("./static/Competitor Data_v2.xlsx", sheet_name=None)
+    finder, build_ms = timed(lambda: PeerFinder.build(sheets, REGIONS, EXCLUDED_COLUMNS))
+    tree, positions = finder.tree()
+    print(f"Peer finder: {finder.values.shape[0]} funds x {finder.values.shape[1]} metrics, built in {build_ms:.1f} ms")
+
+    etfs = finder.jpm_tickers()
+    results = []
+    for k in SIZES:
+        def search_all(search):
+            return [search(finder.positions[etf]) for etf in etfs]
+        brute, brute_ms = timed(lambda: search_all(lambda position: brute_force(finder, position, k)))
+        queried, tree_ms = timed(lambda: search_all(
+            lambda position: [peer for peer in tree.query(finder.values[position], k=k + 1)[1] if peer != position][:k]
+        ))
+        # same distances of the competitors found (funds at the same distance may be swapped at the k-th place)
+        same = all(
+            np.allclose(np.linalg.norm(finder.values[a] - finder.values[finder.positions[etf]], axis=1),
+                        np.linalg.norm(finder.values[b] - finder.values[finder.positions[etf]], axis=1))
+            for etf, a, b in zip(etfs, brute, queried)
+        )
+        results.append({"k": k, "JPM ETFs": len(etfs), "Brute force (ms/ETF)": brute_ms / len(etfs),
+                        "KD-tree (ms/ETF)": tree_ms / len(etfs), "Same distances": same})
+    print(pd.DataFrame(results).to_string(index=False, float_format="{:.3f}".format))
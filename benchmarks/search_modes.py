@@ -0,0 +1,42 @@
+# Latency of the keyword search modes (pages/filter_search.py): semantic (embeddings), lexical (BM25) and hybrid (BM25
+# candidates reranked by embeddings), uncached, over the ETFs of the ETF Filter page. The lexical mode runs without the
+# embedding model; the other modes are skipped if it cannot be loaded.
+# Run from the home directory of the repo:
+#     python -m benchmarks.search_modes
+import time
+import numpy as np
+import pandas as pd
+
+QUERIES = ["semiconductor", "artificial intelligence", "clean energy", "healthcare", "banking", "oil and gas",
+           "electric vehicles", "cloud software", "biotechnology", "real estate", "cybersecurity", "gold miners"]
+TICKERS = ["JEPI", "JPST", "JIRE", "JEPQ", "JQUA", "BBIN"]
+REPEATS = 5
+
+
+def time_mode(mode):
+    from pages.filter_search import score_ETFs
+
+    # Warm up: loads the constituents, embeddings and index, which the dashboard does once at startup
+    score_ETFs(TICKERS, QUERIES[0], mode=mode)
+
+    latencies = []
+    for query in QUERIES:
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            score_ETFs(TICKERS, query, mode=mode)
+            latencies.append(time.perf_counter() - start)
+
+    latencies = np.array(latencies) * 1000
+    return {'Mode': mode, 'Median (ms)': np.median(latencies), 'p95 (ms)': np.percentile(latencies, 95),
+            'Max (ms)': latencies.max()}
+
+
+if __name__ == "__main__":
+    from pages.filter_search import get_bm25_index, model_available, SEARCH_MODES
+
+    start = time.perf_counter()
+    index = get_bm25_index()
+    print(f"BM25 index: {index.n_docs} constituents, {len(index.vocabulary)} terms, built in {time.perf_counter() - start:.2f} s")
+
+    modes = SEARCH_MODES if model_available() else ['lexical']
+    print(pd.DataFrame([time_mode(mode) for mode in modes]).to_string(index=False, float_format='{:.2f}'.format))
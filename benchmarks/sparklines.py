@@ -0,0 +1,58 @@
+# Startup time and grid payload of the sector bar charts of the ETF Filter page (pages/feature1.py) for 5 and 100 ETFs:
+# Plotly figures built in Python for every ETF at import (previous approach) against the numeric series only, drawn in
+# the browser by assets/dashAgGridComponentFunctions.js. Larger universes are made by repeating the JPM ETFs.
+# Run from the home directory of the repo:
+#     python -m benchmarks.sparklines
+import time
+import pandas as pd
+import plotly.express as px
+from plotly.io.json import to_json_plotly
+
+SIZES = [5, 100]
+
+
+def load_etfs(n):
+    df_etf = pd.read_excel("./static/JPMorgan_5-ETF-extract.xlsx", usecols=["Name", "Ticker", "Expense Ratio", "Tot Asset US$ (M)", "Tot Ret 1Y", "Top 5 Sector", "Top 5 %NAV"])
+    df_etf = pd.concat([df_etf] * (n // len(df_etf) + 1), ignore_index=True).head(n)
+    df_etf["Ticker"] = [f"{ticker} {i}" for i, ticker in enumerate(df_etf["Ticker"])]
+    df_etf["Top 5 Sector"] = df_etf["Top 5 Sector"].apply(lambda x: x.split(","))
+    df_etf["Top 5 %NAV"] = df_etf["Top 5 %NAV"].apply(lambda x: x.split(","))
+    return df_etf
+
+
+def add_figures(df_etf):
+    """The figure column as previously built at import"""
+    df_etf["graph"] = ""
+    for i, row in df_etf.iterrows():
+        df_fig = pd.DataFrame({ "Sector": row["Top 5 Sector"], "%NAV": row["Top 5 %NAV"] })
+        fig = px.bar(df_fig, x="Sector", y="%NAV")
+        fig.update_layout(
+            showlegend=False,
+            yaxis_visible=False,
+            yaxis_showticklabels=False,
+            xaxis_visible=False,
+            xaxis_showticklabels=False,
+            margin=dict(l=0, r=0, t=0, b=0),
+            template="none",
+            yaxis={"categoryorder": "total descending"},
+            yaxis_range=[0, 100]
+        )
+        df_etf.at[i, "graph"] = fig
+    return df_etf
+
+
+def measure(n, figures):
+    df_etf = load_etfs(n)
+    start = time.perf_counter()
+    if figures:
+        add_figures(df_etf)
+    seconds = time.perf_counter() - start
+    # rowData of the grid as Dash serializes it
+    payload = len(to_json_plotly(df_etf.to_dict("records")).encode())
+    return {"ETFs": n, "Charts": "Python figures" if figures else "Client-side", "Startup (s)": seconds,
+            "rowData (KB)": payload / 1024}
+
+
+if __name__ == "__main__":
+    results = pd.DataFrame([measure(n, figures) for n in SIZES for figures in [True, False]])
+    print(results.to_string(index=False, float_format="{:.3f}".format))
@@ -0,0 +1,47 @@
+# Figure payload and build time of the time-series chart of the Competitor Analysis page (pages/feature2.py): every
+# daily point as SVG traces (previous chart) against the traces resampled with LTTB (pages/downsampling.py), drawn with
+# WebGL above the point threshold. Render time in the browser is not measured here; it grows with the number of points
+# drawn, which is reported.
+# Run from the home directory of the repo:
+#     python -m benchmarks.time_series
+import time
+import pandas as pd
+import plotly.graph_objects as go
+from pages.price_store import get_price_store
+from pages.downsampling import downsample, SCATTERGL_THRESHOLD
+
+CASES = [
+    (["QQQ US Equity"], "all"),
+    (["QQQ US Equity", "JPST US Equity", "JEPI US Equity", "DFAC US Equity", "JEPQ US Equity"], "all"),
+    (["QQQ US Equity", "JPST US Equity", "JEPI US Equity", "DFAC US Equity", "JEPQ US Equity"], "1095"),
+]
+COLUMN = "PX_LAST"
+
+
+def build_figure(prices, resample):
+    figure = go.Figure()
+    for ticker, (dates, values) in prices.items():
+        if resample:
+            dates, values = downsample(dates, values)
+        scatter = go.Scattergl if resample and len(dates) > SCATTERGL_THRESHOLD else go.Scatter
+        figure.add_trace(scatter(x=dates, y=values, name=ticker, mode="lines"))
+    return figure
+
+
+def measure(tickers, period, resample):
+    store = get_price_store()
+    start = time.perf_counter()
+    prices = store.window(tickers, COLUMN) if period == "all" else store.last_days(tickers, COLUMN, int(period))
+    figure = build_figure(prices, resample)
+    payload = figure.to_json()
+    seconds = time.perf_counter() - start
+    return {"ETFs": len(tickers), "Period": period, "Chart": "LTTB + WebGL" if resample else "All points (SVG)",
+            "Points": sum(len(trace.x) for trace in figure.data), "Payload (KB)": len(payload.encode()) / 1024,
+            "Build (ms)": seconds * 1000}
+
+
+if __name__ == "__main__":
+    # Warm up: loads the prices and Plotly's figure validators
+    measure(*CASES[0], resample=False)
+    results = [measure(tickers, period, resample) for tickers, period in CASES for resample in [False, True]]
+    print(pd.DataFrame(results).to_string(index=False, float_format="{:.1f}".format))
@@ -0,0 +1,32 @@
+# Load time of the static workbooks read by the pages: parsed with openpyxl (pd.read_excel, as the pages used to) against
+# the workbook cache of pages/data_access.py, fresh from disk (as at the start of the dashboard) and from memory (a
+# second page reading the same workbook).
+# Run from the home directory of the repo:
+#     python -m benchmarks.workbooks
+import glob
+import time
+import pandas as pd
+import pages.data_access as data_access
+
+
+def timed(function):
+    start = time.perf_counter()
+    function()
+    return (time.perf_counter() - start) * 1000
+
+
+if __name__ == "__main__":
+    data_access.build_workbook_cache()
+
+    results = []
+    for path in sorted(glob.glob("./static/*.xlsx")):
+        data_access._workbooks.clear()
+        results.append({
+            "Workbook": path.split("/")[-1],
+            "read_excel (ms)": timed(lambda: pd.read_excel(path, sheet_name=None)),
+            "Cache (ms)": timed(lambda: data_access.read_workbook(path, sheet_name=None)),
+            "Memory (ms)": timed(lambda: data_access.read_workbook(path, sheet_name=None)),
+        })
+    results = pd.DataFrame(results)
+    results.loc[len(results)] = ["Total"] + results.iloc[:, 1:].sum().tolist()
+    print(results.to_string(index=False, float_format="{:.1f}".format))
@@ -1,15 +1,22 @@
 import dash
-from dash import Dash, html, dcc
+import diskcache
+from dash import Dash, html, dcc, DiskcacheManager
 import plotly.express as px
 import pandas as pd
 from itertools import islice
 
+from pages.filter_search import search_cache, preload
+
+# background callbacks (e.g. the keyword search) run as jobs in separate processes, tracked in this cache
+background_callback_manager = DiskcacheManager(diskcache.Cache("./pages/data/cache/jobs"))
+
 FEATURES = ["ETF Filter", "Competitor Analysis", "Recommendation", "Macro"]
 
 tailwind_cdn = "https://cdn.tailwindcss.com"
 app = Dash(__name__,
            suppress_callback_exceptions=True,
            use_pages = True, # Access Multiple Pages
+           background_callback_manager=background_callback_manager,
            external_scripts=[tailwind_cdn, { "src": "./assets/tailwind_config.js" }],  # enable TailwindCSS
     )
 
@@ -48,5 +55,14 @@ app.layout = html.Div([
     
 ])
 
+# hit/miss counters of the keyword search cache, for monitoring (counted by the search jobs too, see SearchCache)
+@app.server.route("/search-cache-stats")
+def search_cache_stats():
+    return search_cache.stats()
+
 if __name__ == '__main__':
+    from pages.feature1 import SUPPORTED_TICKERS
+
+    # loaded once here, the background search jobs are forked from this process and start with it in memory
+    preload(SUPPORTED_TICKERS)
     app.run(debug=True)
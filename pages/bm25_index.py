@@ -0,0 +1,120 @@
+import re
+import numpy as np
+
+# Inverted index with BM25 scoring over the (stopword free) descriptions of the unique securities of every ETF in
+# 'pages/data' (see security_master.py).
+# It needs no embedding model: exact-term queries ("semiconductor") are answered from the postings of their terms only,
+# and it is the fallback of the keyword search when the fastText model cannot be loaded.
+
+# Standard BM25 parameters: k1 saturates repeated terms, b normalises by description length
+K1 = 1.5
+B = 0.75
+
+
+def tokenize(text):
+    """Lower case alphanumeric terms of a text, with a trailing plural 's' removed ('semiconductors' -> 'semiconductor')
+
+    Args:
+        text (str): Description or search query
+
+    Returns:
+        List of terms
+    """
+    terms = re.findall(r'[a-z0-9]+', str(text).lower())
+    return [term[:-1] if len(term) > 3 and term.endswith('s') and not term.endswith('ss') else term for term in terms]
+
+
+class BM25Index:
+    """BM25 index over the descriptions of the securities of the security master, one document per security_id
+
+    Postings are stored by term in flat arrays: the descriptions containing term t are docs[offsets[t]:offsets[t + 1]],
+    with the BM25 weight of the term in each of them precomputed in `weights`. Scoring a query is then one slice and
+    addition per query term. A security held by several ETFs is indexed once, so document frequencies count securities.
+    """
+
+    def __init__(self, vocabulary, offsets, docs, weights, max_weights, n_docs):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.docs = docs
+        self.weights = weights
+        # Highest weight each term can reach (infinite frequency in an empty description), used to normalise scores
+        self.max_weights = max_weights
+        self.n_docs = n_docs
+
+    @classmethod
+    def build(cls, master, k1=K1, b=B):
+        """Build the index from the descriptions of the valid securities
+
+        Args:
+            master (SecurityMaster): Unique securities, see security_master.py
+            k1 (float): Term frequency saturation
+            b (float): Length normalisation
+
+        Returns:
+            BM25Index
+        """
+        vocabulary = {}
+        term_ids = []
+        doc_ids = []
+        n_docs = len(master.securities)
+        descriptions = master.securities['Clean Description']
+        # Securities with missing fields are never searched and stay empty documents
+        for security_id in np.flatnonzero(master.valid):
+            for term in tokenize(descriptions.iloc[security_id]):
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_ids.append(security_id)
+
+        term_ids = np.array(term_ids, dtype=np.int64)
+        doc_ids = np.array(doc_ids, dtype=np.int64)
+        doc_lengths = np.bincount(doc_ids, minlength=n_docs)
+        average_length = max(doc_lengths[master.valid].mean(), 1) if master.valid.any() else 1
+
+        # One posting per (term, description) pair, sorted by term, with the number of occurrences of the term
+        pairs, term_freqs = np.unique(term_ids * n_docs + doc_ids, return_counts=True)
+        posting_terms = pairs // n_docs
+        docs = pairs % n_docs
+        doc_freqs = np.bincount(posting_terms, minlength=len(vocabulary))
+        offsets = np.concatenate([[0], np.cumsum(doc_freqs)])
+
+        n_valid = int(master.valid.sum())
+        idf = np.log(1 + (n_valid - doc_freqs + 0.5) / (doc_freqs + 0.5))
+        length_norm = k1 * (1 - b + b * doc_lengths[docs] / average_length)
+        weights = idf[posting_terms] * term_freqs * (k1 + 1) / (term_freqs + length_norm)
+
+        return cls(vocabulary, offsets, docs, weights.astype(np.float32), (idf * (k1 + 1)).astype(np.float32), n_docs)
+
+    def score(self, query, normalize=True):
+        """BM25 score of every security for a query
+
+        Args:
+            query (str): Search query from sales
+            normalize (bool): Divide by the highest score the query terms can reach, giving values in [0, 1)
+
+        Returns:
+            numpy array of one score per security, index it with the security ids of an ETF to get its constituents
+        """
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        terms = {self.vocabulary[term] for term in tokenize(query) if term in self.vocabulary}
+        for term in terms:
+            start, end = self.offsets[term], self.offsets[term + 1]
+            # A term has at most one posting per description, so plain fancy indexing adds without collisions
+            scores[self.docs[start:end]] += self.weights[start:end]
+
+        if normalize and terms:
+            scores /= sum(self.max_weights[term] for term in terms)
+        return scores
+
+    def candidates(self, scores, n):
+        """Positions of the n highest non zero scores
+
+        Args:
+            scores (numpy array): Scores of some securities, e.g. the constituents of an ETF
+            n (int): Maximum number of candidates
+
+        Returns:
+            numpy array of positions in `scores` (unsorted)
+        """
+        matching = np.flatnonzero(scores > 0)
+        if len(matching) > n:
+            matching = matching[np.argpartition(scores[matching], len(matching) - n)[len(matching) - n:]]
+        return matching
@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+import numpy as np
+
+# Compact replacement for the 7 GB 'cc.en.300.bin' model: only the vectors of the words found in the constituent descriptions
+# and of the most frequent words of the model (for queries) are kept, plus the character n-grams of those words so that
+# out-of-vocabulary query words still get a vector. Every matrix is memory-mapped, so only the rows used are read from disk.
+COMPACT_DIR = './pages/data/compact_model'
+
+# Number of most frequent words of the full model kept on top of the description vocabulary, for search queries
+QUERY_VOCAB_SIZE = 50000
+
+
+def word_ngrams(word, minn, maxn):
+    """Character n-grams of a word the way fastText computes them, i.e. on the word wrapped in '<' and '>'
+
+    Args:
+        word (str): Word
+        minn (int): Minimum n-gram length
+        maxn (int): Maximum n-gram length
+
+    Returns:
+        List of n-grams
+    """
+    wrapped = f'<{word}>'
+    return [wrapped[i:i + n] for n in range(minn, maxn + 1) for i in range(len(wrapped) - n + 1)]
+
+
+def build_compact_store(model, words, path=COMPACT_DIR):
+    """Save the word vectors of a vocabulary and the vectors of their character n-grams from a full fastText model
+
+    Args:
+        model (fastText model): Full model, e.g. cc.en.300.bin
+        words (iterable of str): Vocabulary to keep
+        path (str): Directory of the compact store
+    """
+    args = model.f.getArgs()
+    words = sorted(set(words))
+
+    vectors = np.zeros((len(words), model.get_dimension()), dtype=np.float32)
+    ngram_rows = {}
+    for idx, word in enumerate(words):
+        vectors[idx] = model.get_word_vector(word)
+        subwords, subword_ids = model.get_subwords(word)
+        for subword, subword_id in zip(subwords, subword_ids):
+            # The first entry is the word itself when it is part of the model's vocabulary
+            if subword != word and subword not in ngram_rows:
+                ngram_rows[subword] = subword_id
+
+    ngrams = list(ngram_rows)
+    # n-grams are only a fallback for unknown words, half precision keeps them small
+    ngram_vectors = np.zeros((len(ngrams), model.get_dimension()), dtype=np.float16)
+    for idx, ngram in enumerate(ngrams):
+        ngram_vectors[idx] = model.get_input_vector(ngram_rows[ngram])
+
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, 'vectors.npy'), vectors)
+    np.save(os.path.join(path, 'ngram_vectors.npy'), ngram_vectors)
+    with open(os.path.join(path, 'vocab.txt'), 'w', encoding='utf-8') as file:
+        file.write('\n'.join(words))
+    with open(os.path.join(path, 'ngrams.txt'), 'w', encoding='utf-8') as file:
+        file.write('\n'.join(ngrams))
+    with open(os.path.join(path, 'meta.json'), 'w') as file:
+        json.dump({'dim': model.get_dimension(), 'minn': args.minn, 'maxn': args.maxn}, file)
+
+    print(f'Compact store saved to {path}: {len(words)} words, {len(ngrams)} n-grams')
+
+
+def compact_store_exists(path=COMPACT_DIR):
+    return os.path.exists(os.path.join(path, 'meta.json'))
+
+
+class CompactEmbeddings:
+    """Memory-mapped subset of a fastText model with the same get_word_vector / get_sentence_vector semantics"""
+
+    def __init__(self, path=COMPACT_DIR):
+        with open(os.path.join(path, 'meta.json')) as file:
+            meta = json.load(file)
+        self.dim, self.minn, self.maxn = meta['dim'], meta['minn'], meta['maxn']
+        self.path = path
+
+        self.vectors = np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r')
+        with open(os.path.join(path, 'vocab.txt'), encoding='utf-8') as file:
+            self.words = {word: idx for idx, word in enumerate(file.read().split('\n'))}
+
+        # The n-gram table is only needed for unknown words, so it is loaded on the first one
+        self.ngram_vectors = None
+        self.ngrams = None
+
+    def get_dimension(self):
+        return self.dim
+
+    def _load_ngrams(self):
+        self.ngram_vectors = np.load(os.path.join(self.path, 'ngram_vectors.npy'), mmap_mode='r')
+        with open(os.path.join(self.path, 'ngrams.txt'), encoding='utf-8') as file:
+            self.ngrams = {ngram: idx for idx, ngram in enumerate(file.read().split('\n'))}
+
+    def get_word_vector(self, word):
+        """Vector of a word, unknown words are the average of their known character n-grams (zeros if there are none)"""
+        if word in self.words:
+            return np.asarray(self.vectors[self.words[word]])
+
+        if self.ngrams is None:
+            self._load_ngrams()
+        rows = [self.ngrams[ngram] for ngram in word_ngrams(word, self.minn, self.maxn) if ngram in self.ngrams]
+        if not rows:
+            return np.zeros(self.dim, dtype=np.float32)
+        return self.ngram_vectors[sorted(rows)].astype(np.float32).mean(axis=0)
+
+    def get_sentence_vector(self, text):
+        """Average of the unit length word vectors of the whitespace separated words, as fastText does for unsupervised models"""
+        sentence_vector = np.zeros(self.dim, dtype=np.float32)
+        count = 0
+        for word in text.split():
+            vector = self.get_word_vector(word)
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                sentence_vector += vector / norm
+                count += 1
+        return sentence_vector / count if count else sentence_vector
+
+
+if __name__ == "__main__":
+    # Offline step, needs the full model: "python -m pages.compact_embeddings" from the home directory of the repo
+    import fasttext
+    from pages.filter_search import load_constituent_vocabulary
+
+    model_path = sys.argv[1] if len(sys.argv) > 1 else 'cc.en.300.bin'
+    print(f'Loading {model_path}')
+    full_model = fasttext.load_model(model_path)
+
+    vocabulary = load_constituent_vocabulary()
+    print(f'{len(vocabulary)} words in the constituent descriptions and categories')
+    # The model's words are sorted by frequency
+    vocabulary.update(full_model.get_words(on_unicode_error='replace')[:QUERY_VOCAB_SIZE])
+
+    build_compact_store(full_model, vocabulary)
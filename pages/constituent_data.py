@@ -0,0 +1,163 @@
+import os
+import glob
+import hashlib
+import pandas as pd
+import nltk
+from nltk.corpus import stopwords
+from nltk.tokenize import word_tokenize
+
+# Preprocessed constituents ('{etf}_constituents.csv' with the descriptions tokenized and stripped of stopwords) are saved
+# here, keyed by a hash of the source CSV, so tokenization only runs again when the CSV is regenerated
+CACHE_DIR = './pages/data/cache'
+
+# Bumped whenever preprocess_constituents changes what it saves, so older cache files are not read
+PREPROCESS_VERSION = 2
+
+stop_words = None  # Set of English stopwords, loaded on first use
+
+
+def get_stop_words():
+    """Load the NLTK stopwords, downloading the corpora only if they are not installed yet
+
+    Returns:
+        Set of English stopwords
+    """
+    global stop_words
+    if stop_words is None:
+        for resource, package in [('corpora/stopwords', 'stopwords'), ('tokenizers/punkt', 'punkt')]:
+            try:
+                nltk.data.find(resource)
+            except LookupError:
+                nltk.download(package)
+        stop_words = set(stopwords.words('english'))
+    return stop_words
+
+
+def remove_stopwords(text):
+    """Remove stopwords from a text string
+
+    Args:
+        text (str): Text
+
+    Returns:
+        String with stopwords removed
+    """
+    stop_words = get_stop_words()
+    tokens = word_tokenize(text)  # Tokenize the text into words
+    filtered_tokens = [word for word in tokens if word.lower() not in stop_words]  # Remove stopwords
+    return ' '.join(filtered_tokens)  # Join the filtered tokens back into a string
+
+
+def file_hash(path):
+    """SHA-256 of the content of a file"""
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def constituents_path(etf):
+    return f'./pages/data/{etf}_constituents.csv'
+
+
+def cache_path(etf, source_hash):
+    return os.path.join(CACHE_DIR, f'{etf}_constituents.v{PREPROCESS_VERSION}.{source_hash[:16]}.pkl')
+
+
+def parse_percent(column):
+    """Parse a column of percentages such as '1.76%' to floats (1.76), unparseable values become NaN
+
+    Args:
+        column (pandas Series): Column of strings
+
+    Returns:
+        pandas Series of floats
+    """
+    return pd.to_numeric(column.astype(str).str.strip().str.rstrip('%').str.replace(',', ''), errors='coerce')
+
+
+def load_holdings(etf):
+    """Read '{etf}_Holdings.csv' with the 'Weight' and 'Return' percentages parsed to floats
+
+    Args:
+        etf (str): ETF ticker, e.g. 'JEPI'
+
+    Returns:
+        pandas df of 'Ticker', 'Security Name', 'Sector', 'Industry', 'Price', 'Weight', 'Return' and 'Contribution'
+    """
+    holdings_df = pd.read_csv(f'./pages/data/{etf}_Holdings.csv')
+    for column in ['Weight', 'Return']:
+        holdings_df[column] = parse_percent(holdings_df[column])
+    return holdings_df
+
+
+def previous_clean_descriptions(etf):
+    """Clean descriptions of the previous version of an ETF's constituents file, from the cache of the same preprocessing
+
+    Returns:
+        dict of 'Description' -> 'Clean Description'
+    """
+    previous = {}
+    for old_path in glob.glob(os.path.join(CACHE_DIR, f'{etf}_constituents.v{PREPROCESS_VERSION}.*.pkl')):
+        old_df = pd.read_pickle(old_path).dropna(subset=['Description'])
+        previous.update(zip(old_df['Description'], old_df['Clean Description']))
+    return previous
+
+
+def preprocess_constituents(etf):
+    """Tokenize and strip stopwords from the descriptions of an ETF's constituents and save the result
+
+    The description of a row is its fingerprint: descriptions already preprocessed for the previous version of the CSV
+    are reused, only added or changed descriptions are tokenized.
+
+    Args:
+        etf (str): ETF ticker, e.g. 'JEPI'
+
+    Returns:
+        pandas df of every row of the constituents CSV with 'Weights' parsed to floats (in %) and an extra 'Clean Description'
+        column (NaN if 'Description' is NaN)
+    """
+    source_hash = file_hash(constituents_path(etf))
+    source_df = pd.read_csv(constituents_path(etf))
+    source_df['Weights'] = parse_percent(source_df['Weights'])
+
+    previous = previous_clean_descriptions(etf)
+    descriptions = source_df['Description']
+    new = descriptions.notna() & ~descriptions.isin(previous.keys())
+    source_df['Clean Description'] = descriptions.map(previous).astype(object)
+    source_df.loc[new, 'Clean Description'] = descriptions[new].apply(remove_stopwords)
+    print(f'{etf}: {new.sum()} descriptions tokenized, {descriptions.notna().sum() - new.sum()} reused')
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Drop the results of previous versions of the CSV
+    for old_path in glob.glob(os.path.join(CACHE_DIR, f'{etf}_constituents.*.pkl')):
+        os.remove(old_path)
+    source_df.to_pickle(cache_path(etf, source_hash))
+    return source_df
+
+
+def load_constituents(etf):
+    """Read the preprocessed constituents of an ETF, preprocessing them first if the CSV changed since the last run
+
+    Args:
+        etf (str): ETF ticker, e.g. 'JEPI'
+
+    Returns:
+        pandas df of every row of the constituents CSV with float 'Weights' and an extra 'Clean Description' column
+    """
+    path = cache_path(etf, file_hash(constituents_path(etf)))
+    if os.path.exists(path):
+        return pd.read_pickle(path)
+
+    print(f'Preprocessing constituents of {etf}')
+    return preprocess_constituents(etf)
+
+
+def preprocess_all_constituents():
+    """Preprocess the constituents of every ETF in 'pages/data' whose cache is missing or outdated"""
+    for file in sorted(os.listdir('./pages/data')):
+        if file.endswith('_constituents.csv'):
+            load_constituents(file[:-len('_constituents.csv')])
+
+
+if __name__ == "__main__":
+    # Offline step: "python -m pages.constituent_data" from the home directory of the repo
+    preprocess_all_constituents()
@@ -0,0 +1,155 @@
+import os
+import numpy as np
+
+# Inverted-file (IVF) index over the constituents of every ETF in 'pages/data'. Constituents held by several ETFs are
+# indexed once; the unit length embeddings are clustered with spherical k-means and a query only scores the members of
+# the `nprobe` clusters closest to it instead of every constituent of every ETF.
+# The version in the file name is bumped whenever what is saved changes (v2: clusters of the embedding keys)
+INDEX_PATH = './pages/data/embeddings/constituent_index.v2.npz'
+
+# Share of added or changed securities above which the index is clustered again instead of updated
+RECLUSTER_FRACTION = 0.2
+
+
+def list_constituent_etfs():
+    """Tickers of every ETF with a constituents file in 'pages/data'"""
+    return sorted(file[:-len('_constituents.csv')] for file in os.listdir('./pages/data') if file.endswith('_constituents.csv'))
+
+
+def spherical_kmeans(vectors, n_clusters, n_iter=20, seed=0):
+    """Cluster unit length vectors by cosine similarity
+
+    Args:
+        vectors (numpy array): Unit length vectors, one per row
+        n_clusters (int): Number of clusters
+        n_iter (int): Number of iterations
+        seed (int): Seed of the random initial centroids
+
+    Returns:
+        Tuple of the centroids (unit length) and the cluster of each vector
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        norms = np.linalg.norm(sums, axis=1)
+        # Empty clusters keep their previous centroid
+        filled = norms > 0
+        centroids[filled] = sums[filled] / norms[filled, None]
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+class ConstituentIndex:
+    """Approximate nearest neighbour search over the unique constituents of all ETFs
+
+    Attributes:
+        securities (pandas df): One row per unique constituent: 'Symbol', 'Company', 'Sector', 'Industry' and 'ETFs', the
+            tickers of the ETFs holding it
+        vectors (numpy array): Unit length embedding of each security, row aligned with `securities`
+    """
+
+    def __init__(self, securities, vectors, centroids, order, offsets):
+        self.securities = securities
+        self.vectors = vectors
+        self.centroids = centroids
+        # Members of cluster c are order[offsets[c]:offsets[c + 1]]
+        self.order = order
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, master, vectors, n_clusters=None, path=INDEX_PATH):
+        """Build the index from the security master, updating the saved clustering if it is still mostly valid
+
+        Securities whose embedded text did not change keep their saved cluster, added or changed ones join the closest
+        saved centroid. The securities are only clustered again when more than RECLUSTER_FRACTION of them changed.
+
+        Args:
+            master (SecurityMaster): Unique securities of all ETFs, see security_master.py
+            vectors (numpy array): Embedding of each security of the master, e.g. filter_search.security_vectors()
+            n_clusters (int): Number of clusters, about 2 * sqrt(number of securities) by default
+            path (str): File of the saved clustering
+        """
+        # Securities with missing fields (no embedding) are left out, each security lists the ETFs holding it
+        securities = master.securities[['Symbol', 'Company', 'Sector', 'Industry']].assign(ETFs=master.etfs_holding())
+        securities = securities[master.valid].reset_index(drop=True)
+        vectors = np.ascontiguousarray(vectors[master.valid])
+        keys = master.embedding_keys()[master.valid]
+
+        if os.path.exists(path):
+            saved = np.load(path)
+            saved_assignment = np.empty(len(saved['keys']), dtype=int)
+            for cluster in range(len(saved['centroids'])):
+                saved_assignment[saved['order'][saved['offsets'][cluster]:saved['offsets'][cluster + 1]]] = cluster
+            saved_clusters = dict(zip(saved['keys'], saved_assignment))
+
+            reused = np.array([key in saved_clusters for key in keys], dtype=bool)
+            if len(keys) and reused.mean() >= 1 - RECLUSTER_FRACTION:
+                centroids = saved['centroids']
+                assignment = np.empty(len(keys), dtype=int)
+                assignment[reused] = [saved_clusters[key] for key in keys[reused]]
+                assignment[~reused] = np.argmax(vectors[~reused] @ centroids.T, axis=1)
+                changed = (~reused).any() or len(keys) != len(saved['keys'])
+                if changed:
+                    print(f'Constituent index: {(~reused).sum()} securities assigned, {reused.sum()} reused')
+                return cls._save(securities, vectors, centroids, assignment, keys, path if changed else None)
+
+        n_clusters = n_clusters or max(1, min(len(vectors), int(2 * np.sqrt(len(vectors)))))
+        centroids, assignment = spherical_kmeans(vectors, n_clusters)
+        return cls._save(securities, vectors, centroids, assignment, keys, path)
+
+    @classmethod
+    def _save(cls, securities, vectors, centroids, assignment, keys, path):
+        """Index of a clustering, saved to `path` unless it is None (the saved clustering did not change)"""
+        order = np.argsort(assignment, kind='stable')
+        offsets = np.searchsorted(assignment[order], np.arange(len(centroids) + 1))
+
+        if path is not None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written next to the index then moved over it, so other workers never load a partly written file
+            temporary_path = f'{path}.{os.getpid()}.tmp'
+            with open(temporary_path, 'wb') as file:
+                np.savez(file, keys=keys, centroids=centroids, order=order, offsets=offsets)
+            os.replace(temporary_path, path)
+        return cls(securities, vectors, centroids, order, offsets)
+
+    def candidates(self, query_vector, nprobe):
+        """Indices of the securities in the `nprobe` clusters closest to the query"""
+        nprobe = min(nprobe, len(self.centroids))
+        closest = np.argpartition(-(self.centroids @ query_vector), nprobe - 1)[:nprobe]
+        return np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in closest])
+
+    def search(self, query_vector, k=10, nprobe=8, exact=False):
+        """Find the k securities most similar to a query across all ETFs
+
+        Args:
+            query_vector (numpy array): Unit length embedding of the query
+            k (int): Number of results
+            nprobe (int): Number of clusters scanned, ignored in exact mode
+            exact (bool): Score every security (brute force) instead of the probed clusters, to validate recall
+
+        Returns:
+            pandas df of the top k securities sorted by 'Cosine Similarity', with the 'ETFs' holding each of them
+        """
+        candidates = np.arange(len(self.vectors)) if exact else self.candidates(query_vector, nprobe)
+        scores = self.vectors[candidates] @ query_vector
+
+        k = min(k, len(candidates))
+        if k == 0:
+            return self.securities.iloc[[]].assign(**{'Cosine Similarity': []})
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        result = self.securities.iloc[candidates[top]].copy()
+        result['Cosine Similarity'] = scores[top]
+        return result.reset_index(drop=True)
+
+    def recall(self, query_vectors, k=10, nprobe=8):
+        """Share of the exact top k found by the approximate search, averaged over the queries"""
+        found = 0
+        for query_vector in query_vectors:
+            exact = set(self.search(query_vector, k, exact=True)['Symbol'])
+            approximate = set(self.search(query_vector, k, nprobe)['Symbol'])
+            found += len(exact & approximate) / len(exact)
+        return found / len(query_vectors)
@@ -0,0 +1,103 @@
+import os
+import sys
+import glob
+import hashlib
+import pandas as pd
+from pages.constituent_data import file_hash
+
+# The static Excel workbooks are parsed with openpyxl, which takes seconds for the larger ones and used to happen at the
+# import of every page (and twice for 'Competitor Data_v2.xlsx'). Every sheet of a workbook is parsed once and saved as a
+# pickle of DataFrames (binary, dtypes kept as parsed) under a hash of the workbook's path. The pickle is reused as long
+# as the workbook's modification time and size are the ones it was saved with, or, if they differ, its content hash.
+# Parsed workbooks are also kept in memory, so pages reading the same workbook share a single load.
+WORKBOOK_CACHE_DIR = './pages/data/cache/workbooks'
+
+# Bumped whenever what is saved for a workbook changes, so older cache files are not read
+WORKBOOK_CACHE_VERSION = 1
+
+_workbooks = {}  # Absolute path of a workbook -> (stat, dict of sheet name -> pandas df)
+
+
+def workbook_cache_path(path, cache_dir=WORKBOOK_CACHE_DIR):
+    name = os.path.splitext(os.path.basename(path))[0]
+    path_hash = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f'{name}.v{WORKBOOK_CACHE_VERSION}.{path_hash}.pkl')
+
+
+def file_stat(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_workbook(path, cache_dir=WORKBOOK_CACHE_DIR):
+    """Every sheet of a workbook, from memory, the cache or the workbook itself (then saved to the cache)
+
+    Args:
+        path (str): Path of the .xlsx file
+        cache_dir (str): Directory of the parsed workbooks
+
+    Returns:
+        dict of sheet name -> pandas df, as pd.read_excel(path, sheet_name=None). Shared by every caller, not to be modified
+    """
+    key = os.path.abspath(path)
+    stat = file_stat(path)
+    if key in _workbooks and _workbooks[key][0] == stat:
+        return _workbooks[key][1]
+
+    cache_path = workbook_cache_path(path, cache_dir)
+    sheets = None
+    if os.path.exists(cache_path):
+        cached = pd.read_pickle(cache_path)
+        if cached['stat'] == stat:
+            sheets = cached['sheets']
+        elif cached['hash'] == file_hash(path):
+            # Touched or copied but not changed
+            sheets = cached['sheets']
+            pd.to_pickle({'stat': stat, 'hash': cached['hash'], 'sheets': sheets}, cache_path)
+
+    if sheets is None:
+        print(f'Parsing {os.path.basename(path)}')
+        sheets = pd.read_excel(path, sheet_name=None)
+        os.makedirs(cache_dir, exist_ok=True)
+        pd.to_pickle({'stat': stat, 'hash': file_hash(path), 'sheets': sheets}, cache_path)
+
+    _workbooks[key] = (stat, sheets)
+    return sheets
+
+
+def read_workbook(path, sheet_name=0, usecols=None):
+    """Drop-in for pd.read_excel over the cached workbooks
+
+    Args:
+        path (str): Path of the .xlsx file
+        sheet_name (str, int or None): Name or position of the sheet, None for all sheets
+        usecols (list of str): Columns to keep, all columns by default
+
+    Returns:
+        pandas df of the sheet, or dict of sheet name -> pandas df if sheet_name is None. Copies, free to be modified
+    """
+    sheets = load_workbook(path)
+
+    def select(df):
+        return df.copy() if usecols is None else df[[column for column in df.columns if column in usecols]].copy()
+
+    if sheet_name is None:
+        return {name: select(df) for name, df in sheets.items()}
+    if isinstance(sheet_name, int):
+        sheet_name = list(sheets)[sheet_name]
+    return select(sheets[sheet_name])
+
+
+def build_workbook_cache(paths=None):
+    """Parse and cache workbooks ahead of the first start of the dashboard
+
+    Args:
+        paths (list of str): Paths of the .xlsx files, every workbook in './static' by default
+    """
+    for path in paths or sorted(glob.glob('./static/*.xlsx')):
+        load_workbook(path)
+
+
+if __name__ == '__main__':
+    # Run from the home directory of the repo, e.g. "python -m pages.data_access" (optionally with the workbook paths)
+    build_workbook_cache(sys.argv[1:])
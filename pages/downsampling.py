@@ -0,0 +1,70 @@
+import numpy as np
+
+# Resampling of long price histories before they are sent to the browser. A line chart cannot show more points than it
+# has pixels across, so a series is reduced to about one point per pixel with Largest-Triangle-Three-Buckets (LTTB),
+# which keeps the peaks and troughs a plain every-nth-point sample would miss. Charts request the visible range again on
+# zoom, so zooming in brings back the detail.
+
+# Points kept per trace, about the width in pixels of the charts
+POINT_BUDGET = 1000
+
+# Traces with more points than this are drawn with WebGL (Scattergl) rather than SVG
+SCATTERGL_THRESHOLD = 500
+
+
+def lttb(x, y, n_out):
+    """Indices of the points kept by Largest-Triangle-Three-Buckets
+
+    The first and last points are kept; the points in between are split into n_out - 2 buckets, and from each bucket the
+    point forming the largest triangle with the point kept in the previous bucket and the mean of the next bucket.
+
+    Args:
+        x (numpy array): Ascending x values (numbers or datetime64)
+        y (numpy array): y values, without NaN
+        n_out (int): Number of points to keep
+
+    Returns:
+        numpy array of the indices of the kept points, ascending (all the indices if there are no more than n_out points)
+    """
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    x = x.astype("datetime64[s]").astype(float) if np.issubdtype(x.dtype, np.datetime64) else x.astype(float)
+    y = y.astype(float)
+
+    # Bucket b covers points edges[b]:edges[b + 1], the first and last points are buckets of their own
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    bounds = np.r_[edges, n]
+    # Mean of each bucket, the last one being the last point
+    sizes = np.diff(bounds)
+    mean_x = (np.add.reduceat(x, bounds[:-1]) / sizes).tolist()
+    mean_y = (np.add.reduceat(y, bounds[:-1]) / sizes).tolist()
+
+    # The choice in a bucket depends on the point kept in the previous one, so buckets are walked in order; plain Python
+    # floats are faster than NumPy calls on buckets of a few points
+    xs, ys, edges = x.tolist(), y.tolist(), edges.tolist()
+    kept = [0]
+    for bucket in range(n_out - 2):
+        previous_x, previous_y = xs[kept[-1]], ys[kept[-1]]
+        next_x, next_y = mean_x[bucket + 1], mean_y[bucket + 1]
+        best, best_area = edges[bucket], -1.0
+        for point in range(edges[bucket], edges[bucket + 1]):
+            # Twice the area of the triangle of the previous kept point, the point and the next bucket's mean
+            area = abs((previous_x - next_x) * (ys[point] - previous_y) - (previous_x - xs[point]) * (next_y - previous_y))
+            if area > best_area:
+                best, best_area = point, area
+        kept.append(best)
+    kept.append(n - 1)
+    return np.array(kept)
+
+
+def downsample(x, y, n_out=POINT_BUDGET):
+    """Drop the missing values of a series and reduce it to n_out points with LTTB
+
+    Returns:
+        Tuple of the kept x and y numpy arrays
+    """
+    present = ~np.isnan(y)
+    x, y = x[present], y[present]
+    kept = lttb(x, y, n_out)
+    return x[kept], y[kept]
@@ -0,0 +1,322 @@
+import re
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+# Sector screening of the ETF Filter page. The %NAV by sector of every ETF is laid out once as a dense ETF x sector
+# matrix, so a set of criteria is a few vectorized comparisons over whole columns instead of a scan of every ETF's sheet
+# for every criterion.
+#
+# Criteria can also be written as an expression over the sectors and the numeric columns of the ETF data, e.g.
+#     Technology >= 20 AND Energy < 5 AND "Expense Ratio" < 0.4
+# with AND, OR, NOT and parentheses. An expression is parsed once into a tree of nested tuples and compiled into a
+# function of the screening table (build_screen_table) returning the mask of matching ETFs; compiled expressions are
+# cached per expression string.
+
+# Operators of the filter criteria, as chosen in the dropdowns of the page
+OPERATORS = {
+    "g": np.greater,
+    "geq": np.greater_equal,
+    "eq": np.equal,
+    "l": np.less,
+    "leq": np.less_equal,
+}
+
+
+def build_nav_matrix(nav_by_etf):
+    """Dense ETF x sector matrix of %NAV
+
+    Args:
+        nav_by_etf (dict): ETF ticker (e.g. 'JEPI US Equity') -> pandas df of 'Sector' and '%NAV', e.g. all the sheets of
+            'JPMorgan_5-ETF-composition.xlsx'
+
+    Returns:
+        pandas df with one row per ETF and one column per sector, NaN where an ETF has no position in a sector
+    """
+    return pd.DataFrame({etf: df_nav.groupby("Sector")["%NAV"].sum() for etf, df_nav in nav_by_etf.items()}).T.astype(float)
+
+
+def matching_sectors(sectors, category):
+    """Sectors a category or field name refers to: those starting with it, in any case (e.g. 'health' -> 'Health Care')
+
+    Shared by the dropdown criteria (sector_nav) and the expressions (resolve_field), so both screen the same sectors.
+
+    Args:
+        sectors (list of str): Sectors, e.g. the columns of build_nav_matrix
+        category (str): Category of the filter or field of an expression
+
+    Returns:
+        List of the matching sectors, in the order of `sectors`
+    """
+    lower = category.lower()
+    return [sector for sector in sectors if sector.lower().startswith(lower)]
+
+
+def sector_nav(nav_matrix, category):
+    """%NAV of every ETF in the sectors matching a category (see matching_sectors), NaN if none
+
+    Args:
+        nav_matrix (pandas df): Result of build_nav_matrix
+        category (str): Category of the filter, e.g. 'Health Care'
+
+    Returns:
+        numpy array of one value per ETF (row of the matrix)
+    """
+    columns = matching_sectors(list(nav_matrix.columns), category)
+    return nav_matrix[columns].sum(axis=1, min_count=1).to_numpy()
+
+
+def screen_ETFs(nav_matrix, categories, operators, thresholds, combine="or"):
+    """ETFs whose %NAV meets the criteria
+
+    Args:
+        nav_matrix (pandas df): Result of build_nav_matrix
+        categories (list of str): Category of each criterion
+        operators (list of str): Operator of each criterion, a key of OPERATORS
+        thresholds (list of float): %NAV of each criterion
+        combine (str): 'or' to keep ETFs meeting any criterion, 'and' to keep ETFs meeting all of them. Criteria
+            without an operator or threshold are ignored, an ETF without the sector of a criterion does not meet it
+
+    Returns:
+        List of the ETF tickers (rows of the matrix) meeting the criteria, empty if no criterion is complete
+    """
+    masks = [
+        OPERATORS[operator](sector_nav(nav_matrix, category), float(threshold))
+        for category, operator, threshold in zip(categories, operators, thresholds)
+        if operator in OPERATORS and threshold is not None
+    ]
+    if not masks:
+        # no complete criterion selects no ETF, whether combined with 'and' or 'or'
+        return []
+    masks = np.array(masks, dtype=bool)
+    selected = masks.all(axis=0) if combine == "and" else masks.any(axis=0)
+    return nav_matrix.index[selected].tolist()
+
+
+# Comparison operators of screening expressions
+COMPARISONS = {
+    ">=": np.greater_equal,
+    "<=": np.less_equal,
+    "!=": np.not_equal,
+    "==": np.equal,
+    "=": np.equal,
+    ">": np.greater,
+    "<": np.less,
+}
+KEYWORDS = {"AND", "OR", "NOT"}
+
+TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<number>[-+]?(?:\d+\.?\d*|\.\d+)%?)
+        |(?P<string>"[^"]*"|'[^']*')
+        |(?P<operator>>=|<=|!=|==|=|>|<)
+        |(?P<paren>[()])
+        |(?P<word>[^\s()<>=!"']+)
+    )""", re.VERBOSE)
+
+
+class ScreenError(ValueError):
+    """Invalid screening expression, the message says what and where"""
+
+
+def tokenize_expression(expression):
+    """Split a screening expression into (kind, value, position) tokens
+
+    Kinds are 'number', 'string' (a quoted field name, without the quotes), 'operator', 'paren', 'keyword' (AND, OR,
+    NOT, any case) and 'word' (a word of an unquoted field name).
+    """
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = TOKEN.match(expression, position)
+        if match is None:
+            rest = expression[position:]
+            raise ScreenError(f"Unexpected character {rest.lstrip()[0]!r} at position {position + len(rest) - len(rest.lstrip())}")
+        kind = match.lastgroup
+        value, start = match.group(kind), match.start(kind)
+        if kind == "string":
+            value = value[1:-1]
+        elif kind == "number":
+            value = float(value.rstrip("%"))
+        elif kind == "word" and value.upper() in KEYWORDS:
+            kind, value = "keyword", value.upper()
+        tokens.append((kind, value, start))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive descent parser of screening expressions:
+
+        expression := term (OR term)*
+        term       := factor (AND factor)*
+        factor     := NOT factor | '(' expression ')' | field operator number
+        field      := string | word+
+    """
+
+    def __init__(self, expression):
+        self.tokens = tokenize_expression(expression)
+        self.position = 0
+
+    def peek(self, kind=None, value=None):
+        if self.position >= len(self.tokens):
+            return None
+        token = self.tokens[self.position]
+        if (kind is not None and token[0] != kind) or (value is not None and token[1] != value):
+            return None
+        return token
+
+    def take(self, kind, value=None, expected=None):
+        token = self.peek(kind, value)
+        if token is None:
+            found = self.tokens[self.position] if self.position < len(self.tokens) else None
+            where = f"{found[1]!r} at position {found[2]}" if found else "end of expression"
+            raise ScreenError(f"Expected {expected or value or kind}, found {where}")
+        self.position += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise ScreenError("Empty expression")
+        tree = self.expression()
+        if self.position < len(self.tokens):
+            kind, value, position = self.tokens[self.position]
+            raise ScreenError(f"Unexpected {value!r} at position {position}")
+        return tree
+
+    def expression(self):
+        terms = [self.term()]
+        while self.peek("keyword", "OR"):
+            self.position += 1
+            terms.append(self.term())
+        return terms[0] if len(terms) == 1 else ("or", tuple(terms))
+
+    def term(self):
+        factors = [self.factor()]
+        while self.peek("keyword", "AND"):
+            self.position += 1
+            factors.append(self.factor())
+        return factors[0] if len(factors) == 1 else ("and", tuple(factors))
+
+    def factor(self):
+        if self.peek("keyword", "NOT"):
+            self.position += 1
+            return ("not", self.factor())
+        if self.peek("paren", "("):
+            self.position += 1
+            tree = self.expression()
+            self.take("paren", ")")
+            return tree
+
+        if self.peek("string"):
+            field = self.take("string")[1]
+        else:
+            words = [self.take("word", expected="a field")[1]]
+            while self.peek("word"):
+                words.append(self.take("word")[1])
+            field = " ".join(words)
+        operator = self.take("operator", expected="a comparison operator")[1]
+        threshold = self.take("number", expected="a number")[1]
+        return ("compare", field, operator, threshold)
+
+
+@lru_cache(maxsize=256)
+def parse_expression(expression):
+    """Parse a screening expression into a tree of nested tuples: ('or', children), ('and', children), ('not', child)
+    and ('compare', field, operator, number)
+
+    Raises:
+        ScreenError: If the expression is not valid
+    """
+    return _Parser(expression).parse()
+
+
+def build_screen_table(nav_matrix, df_etf):
+    """Fields of screening expressions for every ETF: %NAV of each sector and the numeric columns of the ETF data
+
+    Args:
+        nav_matrix (pandas df): Result of build_nav_matrix
+        df_etf (pandas df): ETF data with a 'Ticker' column, e.g. the extract of the JPM ETFs
+
+    Returns:
+        pandas df of floats with one row per ETF of nav_matrix, and its 'sectors' attribute listing the sector columns
+    """
+    numeric = df_etf.set_index("Ticker").select_dtypes("number").reindex(nav_matrix.index)
+    table = pd.concat([nav_matrix, numeric.drop(columns=nav_matrix.columns, errors="ignore")], axis=1).astype(float)
+    table.attrs["sectors"] = list(nav_matrix.columns)
+    return table
+
+
+def resolve_field(field, columns, sectors):
+    """Columns of the screening table a field refers to: a numeric column of the same name (any case), otherwise the
+    sectors matching it (see matching_sectors)
+
+    Raises:
+        ScreenError: If the field matches no column
+    """
+    lower = field.lower()
+    for column in columns:
+        if column.lower() == lower and column not in sectors:
+            return (columns.index(column),)
+    matches = tuple(columns.index(sector) for sector in matching_sectors(sectors, field))
+    if not matches:
+        raise ScreenError(f"Unknown field {field!r}, expected a sector or one of "
+                          f"{[column for column in columns if column not in sectors]}")
+    return matches
+
+
+def _compile(tree, columns, sectors):
+    kind = tree[0]
+    if kind == "compare":
+        _, field, operator, threshold = tree
+        ids = list(resolve_field(field, columns, sectors))
+        comparison = COMPARISONS[operator]
+
+        def compare(values):
+            selected = values[:, ids]
+            # Sum of the matching sectors, NaN if an ETF has none of them (it then meets no comparison)
+            total = np.where(np.isnan(selected).all(axis=1), np.nan, np.nansum(selected, axis=1))
+            return comparison(total, threshold)
+        return compare
+    if kind == "not":
+        child = _compile(tree[1], columns, sectors)
+        return lambda values: ~child(values)
+    children = [_compile(child, columns, sectors) for child in tree[1]]
+    combine = np.logical_and.reduce if kind == "and" else np.logical_or.reduce
+    return lambda values: combine([child(values) for child in children])
+
+
+@lru_cache(maxsize=256)
+def compile_expression(expression, columns, sectors):
+    """Compile a screening expression for the columns of a screening table
+
+    Args:
+        expression (str): e.g. 'Technology >= 20 AND "Expense Ratio" < 0.4'
+        columns (tuple of str): Columns of the screening table
+        sectors (tuple of str): Columns of the table which are sectors
+
+    Returns:
+        Function of the values of the table (2D numpy array) returning the boolean mask of the matching rows
+
+    Raises:
+        ScreenError: If the expression is not valid or refers to an unknown field
+    """
+    return _compile(parse_expression(expression), list(columns), list(sectors))
+
+
+def screen_expression(table, expression):
+    """ETFs matching a screening expression
+
+    Args:
+        table (pandas df): Result of build_screen_table
+        expression (str): e.g. 'Technology >= 20 AND Energy < 5 AND "Expense Ratio" < 0.4'
+
+    Returns:
+        List of the ETF tickers (rows of the table) matching the expression
+
+    Raises:
+        ScreenError: If the expression is not valid or refers to an unknown field
+    """
+    plan = compile_expression(expression.strip(), tuple(table.columns), tuple(table.attrs["sectors"]))
+    return table.index[plan(table.to_numpy())].tolist()
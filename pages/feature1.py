@@ -1,13 +1,16 @@
 import dash
 import dash_ag_grid as dag
 import plotly.express as px
-from dash import dcc, html, callback, ctx, Output, Input, State, ALL, MATCH
+from dash import dcc, html, callback, ctx, no_update, Output, Input, State, ALL, MATCH
 import dash_mantine_components as dmc
 import dash_bootstrap_components as dbc
 import pandas as pd
 import json
 
-from pages.filter_search import get_ETF_similarity
+from pages.filter_search import get_ETF_similarity, get_theme_similarity, resolve_search_mode, model_available, SEARCH_MODES, SIMILARITY_COLUMNS
+from pages.result_store import save_result, load_result, get_rows
+from pages.etf_screen import build_nav_matrix, screen_ETFs, build_screen_table, screen_expression, ScreenError
+from pages.data_access import read_workbook
 from components.TitleWithIcon import TitleWithIcon
 
 dash.register_page(__name__, path='/')
@@ -23,40 +26,20 @@ with open("./static/ETF_categories.json") as file:
 parent_categories = list(categories.keys())
 
 # read JPM ETF data
-df_etf = pd.read_excel("./static/JPMorgan_5-ETF-extract.xlsx", usecols=["Name", "Ticker", "Expense Ratio", "Tot Asset US$ (M)", "Tot Ret 1Y", "Top 5 Sector", "Top 5 %NAV"])
+df_etf = read_workbook("./static/JPMorgan_5-ETF-extract.xlsx", usecols=["Name", "Ticker", "Expense Ratio", "Tot Asset US$ (M)", "Tot Ret 1Y", "Top 5 Sector", "Top 5 %NAV"])
 df_etf["Top 5 Sector"] = df_etf["Top 5 Sector"].apply(lambda x: x.split(","))
 df_etf["Top 5 %NAV"] = df_etf["Top 5 %NAV"].apply(lambda x: x.split(","))
 df_etf["Name"] = df_etf[["Name", "Ticker"]].apply(lambda x: ",".join(x), axis=1)
 
 # read holdings of JPM ETFs
-df_holding = pd.read_excel("./static/JPMorgan_5-ETF-holdings.xlsx", sheet_name=None)  # read all sheets, i.e holdings of all ETFs
+df_holding = read_workbook("./static/JPMorgan_5-ETF-holdings.xlsx", sheet_name=None)  # read all sheets, i.e holdings of all ETFs
 
 # read %NAV by sector of JPM ETFs
-df_nav_perct = pd.read_excel("./static/JPMorgan_5-ETF-composition.xlsx", sheet_name=None)
-
-# generate bar charts of %NAV by sector and store in new column
-df_etf["graph"] = ""
-for i, row in df_etf.iterrows():
-    df_fig = pd.DataFrame({ "Sector": row["Top 5 Sector"], "%NAV": row["Top 5 %NAV"] })
-    
-    fig = px.bar(
-        df_fig,
-        x="Sector",
-        y="%NAV",
-    )
-    
-    fig.update_layout(
-        showlegend=False,
-        yaxis_visible=False,
-        yaxis_showticklabels=False,
-        xaxis_visible=False,
-        xaxis_showticklabels=False,
-        margin=dict(l=0, r=0, t=0, b=0),
-        template="none",
-        yaxis={"categoryorder": "total descending"},
-        yaxis_range=[0, 100]
-    )
-    df_etf.at[i, "graph"] = fig
+df_nav_perct = read_workbook("./static/JPMorgan_5-ETF-composition.xlsx", sheet_name=None)
+# ETF x sector matrix of %NAV, screened by apply_ETF_filter
+nav_matrix = build_nav_matrix(df_nav_perct)
+# sectors and numeric columns of every ETF, screened by expressions (e.g. 'Technology >= 20 AND "Expense Ratio" < 0.4')
+screen_table = build_screen_table(nav_matrix, df_etf)
 
 # Ag Grid config
 columnDefs = [
@@ -67,9 +50,11 @@ columnDefs = [
         "maxWidth": 230
     },
     {
-        "field": "graph",
+        # bar chart drawn in the browser from the "Top 5 Sector" and "Top 5 %NAV" lists of the row (see assets/dashAgGridComponentFunctions.js)
+        "field": "Top 5 %NAV",
         "cellRenderer": "DCC_GraphClickData",
         "headerName": "Top 5 Holdings by Sector (%NAV)",
+        "sortable": False,
         "minWidth": 250,
         "maxWidth": 450,
     },
@@ -116,6 +101,15 @@ layout = html.Div([
                     className="w-full"
                 ),
 
+                # semantic: embeddings, lexical: exact terms (BM25), hybrid: exact terms reranked by embeddings
+                dmc.SegmentedControl(
+                    id="keyword-search-mode",
+                    data=[{"value": mode, "label": mode.capitalize()} for mode in SEARCH_MODES],
+                    value="semantic",
+                    size="xs",
+                    fullWidth=True
+                ),
+
                 html.Div([
                     
                     dmc.HoverCard(
@@ -138,7 +132,10 @@ layout = html.Div([
                     
                 ], className="w-full flex justify-between items-center"),
                 
+                # handle of the search result kept on the server, and the ticker shown in the modal
                 dcc.Store(id="constituent-similarity-data"),
+                # progress of the running search, one step per ETF
+                dmc.Progress(id="keyword-search-progress", value=0, color="#096183", className="hidden"),
                 dcc.Loading(
                     id="loading-1",
                     type="circle",
@@ -171,6 +168,29 @@ layout = html.Div([
             ], className="flex flex-col items-end gap-2")
 
         ], className="flex flex-col gap-2 mb-2"),
+
+        html.Div([
+
+            # theme query, scores several keywords against every ETF at once
+            TitleWithIcon(
+                icon_path="../assets/Icons/IconKeyword.svg",
+                title="Score by Themes",
+                className="flex gap-2 items-center pb-2 border-b-2 border-b-bronze"
+            ),
+
+            html.Div([
+
+                dmc.TextInput(
+                    id="theme-input",
+                    placeholder="Enter themes, separated by commas",
+                    className="w-full"
+                ),
+
+                dmc.Button("Score", id="theme-search-button", className="bg-aqua"),
+
+            ], className="flex flex-col items-end gap-2")
+
+        ], className="flex flex-col gap-2 mb-2"),
         
         
         # filter list on the left
@@ -207,11 +227,56 @@ layout = html.Div([
                              
             ])
             
+        ], className="flex flex-col gap-2"),
+
+        # criteria written as an expression over sectors and ETF data
+        TitleWithIcon(
+            icon_path="../assets/Icons/IconFilter.svg",
+            title="Filter by Expression",
+            className="flex gap-2 items-center pb-2 border-b-2 border-b-bronze"
+        ),
+
+        html.Div([
+
+            dmc.TextInput(
+                id="screen-expression",
+                placeholder='e.g. Technology >= 20 AND "Expense Ratio" < 0.4',
+                className="w-full"
+            ),
+
+            html.Div([
+
+                dmc.HoverCard(
+                    withArrow=True,
+                    width=300,
+                    shadow="md",
+                    children=[
+                        dmc.HoverCardTarget(html.Span("Help", className="text-[14px] text-aqua/70 hover:text-aqua hover:underline hover:cursor-pointer")),
+                        dmc.HoverCardDropdown(
+                            dmc.Text(
+                                "Compare sectors (% NAV, all sectors starting with the name) or " + ", ".join(f'"{column}"' for column in screen_table.columns if column not in nav_matrix.columns) + " with >, >=, =, !=, <, <= and a number, and combine comparisons with AND, OR, NOT and parentheses. Quote names with special characters.",
+                                size="sm",
+                            ),
+                        ),
+                    ],
+                    className="bg-none hover:bg-none"
+                ),
+
+                dmc.Button("Screen", id="screen-expression-button", className="bg-aqua")
+
+            ], className="w-full flex justify-between items-center")
+
         ], className="flex flex-col gap-2")
         
     ], className="py-4 flex flex-col gap-4 w-[20%]"),
     
     html.Div([
+
+        # heatmap of theme x ETF scores, hidden until themes are scored
+        dcc.Loading(
+            type="circle",
+            children=html.Div(id="theme-heatmap", className="hidden"),
+        ),
         
         # displays what categories the user has selected, hidden by default  
         html.Div([
@@ -224,9 +289,17 @@ layout = html.Div([
 
             html.Div([
                 
+                # whether an ETF must meet any or all of the criteria
+                dmc.SegmentedControl(
+                    id="filter-combine",
+                    data=[{"value": "or", "label": "Match any"}, {"value": "and", "label": "Match all"}],
+                    value="or",
+                    size="xs"
+                ),
+
                 html.Button(id="submit-filter", children="Search", className="px-4 py-[6px] border border-gray-medium font-medium hover:bg-aqua hover:text-white rounded-md")
         
-            ], className="flex justify-end")
+            ], className="flex justify-end items-center gap-4")
 
         ], id="selection-display", className="flex-grow p-4 bg-aqua/5 rounded-lg"),
         
@@ -324,53 +397,44 @@ def hide_selection(*args):
     selection = list(filter(lambda x: x, args[:-2]))
     return (state1, state2) if len(selection) else ("hidden", "hidden")
 
-# applies filter criteria to the JPM ETF data (df_etf) and outputs matching ETFs
+# applies filter criteria (selected categories or expression) to the JPM ETF data (df_etf) and outputs matching ETFs
 @callback(
-    Output("etf-ag-grid", "rowData"),
-    Input("submit-filter", "n_clicks"),
+    [
+        Output("etf-ag-grid", "rowData"),
+        Output("screen-expression", "error")
+    ],
+    [
+        Input("submit-filter", "n_clicks"),
+        Input("screen-expression-button", "n_clicks")
+    ],
     [
         State("filter-data", "data"),
         State({"type": "filter-operator", "index": ALL}, "value"),
-        State({"type": "filter-threshold", "index": ALL}, "value")
+        State({"type": "filter-threshold", "index": ALL}, "value"),
+        State("filter-combine", "value"),
+        State("screen-expression", "value")
     ],
     prevent_initial_call=True
 )
-def apply_ETF_filter(n_clicks, selected_categories, operator, threshold):
+def apply_ETF_filter(n_clicks, n_clicks_expression, selected_categories, operator, threshold, combine, expression):
     # print("Filter criteria:")
     # print(f"\t\u27a4 {selected_categories=}")
     # print(f"\t\u27a4 {operator=}")
     # print(f"\t\u27a4 {threshold=}")
     
-    filter_ticker = []
-    
-    for ETF_name, df_nav in df_nav_perct.items():
-        # print(ETF_name)
-        for ind, sector in enumerate(list(selected_categories.keys())):
-            sector_nav = df_nav.loc[df_nav["Sector"].str.match(sector)]["%NAV"]
-            if len(sector_nav) == 0:
-                continue
-            nav = float(df_nav.loc[df_nav["Sector"].str.match(sector)]["%NAV"].item())
-            target_nav = float(threshold[ind])
-            op = operator[ind]
-            
-            if op == "geq" and nav >= target_nav:
-                filter_ticker.append(ETF_name)
-            
-            elif op == "g" and nav > target_nav:
-                filter_ticker.append(ETF_name)
-                
-            elif op == "eq" and nav == target_nav:
-                filter_ticker.append(ETF_name)
-            
-            elif op == "l" and nav < target_nav:
-                filter_ticker.append(ETF_name)
-                
-            elif op == "leq" and nav <= target_nav:
-                filter_ticker.append(ETF_name)
+    if ctx.triggered_id == "screen-expression-button":
+        # parsed and compiled once per expression, evaluated over all ETFs at once
+        try:
+            filter_ticker = screen_expression(screen_table, expression or "")
+        except ScreenError as error:
+            return no_update, str(error)
+    else:
+        # one criterion per selected parent category, evaluated over all ETFs at once
+        filter_ticker = screen_ETFs(nav_matrix, list(selected_categories.keys()), operator, threshold, combine)
   
-    df_filter = df_etf[df_etf["Ticker"].apply(lambda x: x in filter_ticker)]
+    df_filter = df_etf[df_etf["Ticker"].isin(filter_ticker)]
     
-    return df_filter.to_dict("records")
+    return df_filter.to_dict("records"), ""
 
 @callback(
     [
@@ -380,10 +444,28 @@ def apply_ETF_filter(n_clicks, selected_categories, operator, threshold):
     ],
     Input("keyword-search-button", "n_clicks"),
     State("keyword-input", "value"),
+    State("keyword-search-mode", "value"),
+    # runs in a background job so the embedding scan does not block a server worker; a new search while one is running
+    # cancels the superseded job
+    background=True,
+    progress=[
+        Output("keyword-search-progress", "value"),
+        Output("keyword-search-progress", "label")
+    ],
+    running=[
+        (Output("keyword-search-progress", "className"), "w-full", "hidden")
+    ],
     prevent_initial_call=True
 )
-def keyword_search(n_clicks, keyword):
-    similarity_scores, constituent_similarity = get_ETF_similarity(SUPPORTED_TICKERS, keyword)
+def keyword_search(set_progress, n_clicks, keyword, mode):
+    # lexical if the embedding model cannot be loaded
+    mode = resolve_search_mode(mode)
+    similarity_scores, constituent_similarity = get_ETF_similarity(
+        SUPPORTED_TICKERS,
+        keyword,
+        progress=lambda done, total, etf: set_progress((100 * done / total, etf)),
+        mode=mode
+    )
     # print(similarity_scores)
     similarity_scores = sorted(similarity_scores.items(), key=lambda x: x[1], reverse=True)
     similarity_scores = similarity_scores[:3]
@@ -417,7 +499,8 @@ def keyword_search(n_clicks, keyword):
     tickers = list(map(lambda x: x[0] + " US Equity", similarity_scores))
     df = df_etf[df_etf["Ticker"].apply(lambda x: x in tickers)]
     
-    return children, df.to_dict("records"), constituent_similarity
+    # the constituents stay on the server, the modal fetches them page by page through the handle
+    return children, df.to_dict("records"), {"handle": save_result(constituent_similarity), "mode": mode}
 
 @callback(
     Output("ticker-modal", "opened"),
@@ -444,28 +527,89 @@ def control_ticker_modal(nc1, nc2, opened):
 )
 def populate_ticker_modal(nc1, data):
     selected_ticker = ctx.triggered_id["index"]
-    constituent_similarity_df = pd.DataFrame.from_dict(data[selected_ticker])
     
     columnDefs_modal = [
         { "field": "Company", "cellClass": "text-jade" },
         { 
             "field": "Weights",
             "cellClass": "text-aqua",
+            "valueFormatter": {"function": 'd3.format(".2f")(params.value) + "%"'},
             "maxWidth": 150,
             "sortable": True
         },
         { 
-            "field": "Cosine Similarity",
+            "field": SIMILARITY_COLUMNS[(data or {}).get("mode", "semantic")],
             "valueFormatter": {"function": 'd3.format("(,.3f")(params.value)'},
             "maxWidth": 180,
             "sortable": True
         }
     ]
     
-    children = dag.AgGrid(
-        id="ticker-modal-ag-grid",
-        rowData=constituent_similarity_df.to_dict("records"),
+    # rows are requested page by page (infinite row model) from the result kept on the server, see get_constituent_rows
+    children = [dag.AgGrid(
+        id={"type": "ticker-modal-ag-grid", "index": selected_ticker},
         columnDefs=columnDefs_modal,
+        rowModelType="infinite",
+        dashGridOptions={"cacheBlockSize": 100, "maxBlocksInCache": 10},
+    )]
+    
+    return children, f"Constituent Breakdown for {selected_ticker}"
+
+# scores every theme against every supported ETF in one pass and shows them as a heatmap
+@callback(
+    [
+        Output("theme-heatmap", "children"),
+        Output("theme-heatmap", "className")
+    ],
+    Input("theme-search-button", "n_clicks"),
+    State("theme-input", "value"),
+    prevent_initial_call=True
+)
+def theme_search(n_clicks, themes):
+    # unique, non-empty themes in the order they were typed
+    keywords = list(dict.fromkeys(theme.strip() for theme in (themes or "").split(",") if theme.strip()))
+    if not keywords:
+        return None, "hidden"
+
+    theme_scores, _ = get_theme_similarity(SUPPORTED_TICKERS, keywords)
+
+    fig = px.imshow(
+        theme_scores,
+        text_auto=".1f",
+        aspect="auto",
+        color_continuous_scale=["#f5f7f8", "#096183"],
+        labels={"x": "ETF", "y": "Theme", "color": "Score"},
+    )
+    fig.update_layout(margin=dict(l=0, r=0, t=0, b=0))
+
+    graph = dcc.Graph(
+        figure=fig,
+        config={"displayModeBar": False},
+        style={"height": f"{120 + 40 * len(keywords)}px"}
     )
+    if not model_available():
+        # get_theme_similarity fell back to exact terms (BM25)
+        graph = html.Div([
+            html.Span("Embedding model unavailable, themes are scored by their exact terms", className="text-[14px] text-bronze"),
+            graph
+        ])
+    return graph, "p-4 bg-aqua/5 rounded-lg"
+
+# serves a sorted page of the selected ETF's constituents to the modal grid
+@callback(
+    Output({"type": "ticker-modal-ag-grid", "index": MATCH}, "getRowsResponse"),
+    Input({"type": "ticker-modal-ag-grid", "index": MATCH}, "getRowsRequest"),
+    State("constituent-similarity-data", "data"),
+    prevent_initial_call=True
+)
+def get_constituent_rows(request, data):
+    if request is None or data is None:
+        return no_update
     
-    return children, f"Constituent Breakdown for {selected_ticker}"
\ No newline at end of file
+    result = load_result(data["handle"])
+    if result is None:
+        # the result was evicted from the store, show an empty grid rather than failing
+        return {"rowData": [], "rowCount": 0}
+    
+    selected_ticker = ctx.triggered_id["index"]
+    return get_rows(result[selected_ticker], request["startRow"], request["endRow"], request.get("sortModel"))
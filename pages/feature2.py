@@ -1,12 +1,20 @@
 import dash
-from dash import dcc, html, Input, Output, State, ALL
+from dash import dcc, html, Input, Output, State, ALL, Patch, no_update
 import dash_mantine_components as dmc
 import dash_ag_grid as dag
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
-from pages.feature2_backend import find_advantage, clean_competitor_data, select_column
+from pages.feature2_backend import find_advantage, clean_competitor_data, CompetitorMatrix
+from pages.data_access import read_workbook, file_stat
+from pages.price_store import get_price_store, data_version
+from pages.price_analytics import get_analytics, ANALYTICS_COLUMNS
+from pages.downsampling import downsample, SCATTERGL_THRESHOLD
+from pages.overlap import get_overlap
+from pages.lookthrough import etf_ticker
+from pages.figure_cache import FigureCache, trace_patch
+from pages.peer_finder import PeerFinder
 
 dash.register_page(__name__)
 
@@ -32,12 +40,20 @@ def blank_fig():
     
     return fig
 
-df_v2 = pd.read_excel("./static/Competitor Data_v2.xlsx", sheet_name=None)
+COMPETITOR_DATA_PATH = "./static/Competitor Data_v2.xlsx"
+df_v2 = read_workbook(COMPETITOR_DATA_PATH, sheet_name=None)
+COMPETITOR_DATA_VERSION = "{}:{}".format(*file_stat(COMPETITOR_DATA_PATH)) # version of the workbook the figures are built from
 df = df_v2["Competitor Data"]
-df1 = pd.read_csv("price data/JEPI US Equity.csv") #to get columns for time-series plot
+# cleaned metrics of every competitor, compared by find_advantage on each selection
+competitor_matrix = CompetitorMatrix(clean_competitor_data(df))
+price_store = get_price_store() # prices of every ETF in 'price data', for the time-series plot
+figure_cache = FigureCache() # figures of the graph, shared by every user
+BENCHMARK = "QQQ US Equity" # default benchmark of the rolling analytics
 
 excluded_columns = ["North", "Name", "Primary Exchange", "Ticker", "Parent Comp. Name", "Fund Objective", 
 "Fund Geographical Focus", "Fund Asset Class Focus", "General Attribute"] # Remove all non-quantiative columns
+# nearest competitors of an ETF over the standardized metrics of every fund of the region sheets
+peer_finder = PeerFinder.build(df_v2, REGIONS, excluded_columns)
 
 layout = html.Div(
     [
@@ -102,6 +118,7 @@ layout = html.Div(
                             {"label": "6 Months", "value": "180"},
                             {"label": "1 Year", "value": "365"},
                             {"label": "3 Years", "value": "1095"},
+                            {"label": "All", "value": "all"},
                         ],
                     ),
                 ]),
@@ -112,10 +129,21 @@ layout = html.Div(
                         id='column',
                         placeholder="Select Variable:",
                         options=[
-                            {'label': col, 'value': col} for col in df1.columns
+                            {'label': col, 'value': col} for col in price_store.columns + ANALYTICS_COLUMNS
                         ],
                         #value = 'FUND_NET_ASSET_VAL',
                     ),
+                    # benchmark of the rolling analytics (alpha, beta, tracking error...)
+                    dcc.Dropdown(
+                        id='benchmark',
+                        placeholder="Select Benchmark:",
+                        options=[
+                            {'label': f"Benchmark: {ticker}", 'value': ticker} for ticker in price_store.dates
+                        ],
+                        value=BENCHMARK,
+                        clearable=False,
+                        className="mt-4"
+                    ),
                 ])
                 
             ], className="flex flex-col gap-4"),
@@ -160,15 +188,52 @@ layout = html.Div(
                     ], value=region) for region in REGIONS
                 ])                      
             ]),
+
+            # Suggests the competitors most similar to a JPM ETF, and selects them
+            html.Div([
+
+                html.Div([
+                    html.Img(src="../assets/Icons/IconCompetitor.svg", className="w-[25px] h-[25px]"),
+                    html.Span("Similar Competitors", className="text-[18px] font-medium")
+                ], className="flex gap-2 items-center pb-2 border-b-2 border-b-bronze mb-2"),
+
+                dcc.Dropdown(
+                    id="peer-etf",
+                    placeholder="Select JPM ETF:",
+                    options=peer_finder.jpm_tickers(),
+                ),
+                dcc.Dropdown(
+                    id="peer-region",
+                    placeholder="All Regions",
+                    options=REGIONS,
+                    className="mt-2"
+                ),
+                dcc.Dropdown(
+                    id="peer-asset-class",
+                    placeholder="All Asset Classes",
+                    options=peer_finder.asset_classes(),
+                    className="mt-2"
+                ),
+                html.Div([
+                    dmc.NumberInput(id="peer-count", value=5, min=1, max=20, className="w-full"),
+                    dmc.Button("Select", id="peer-select-button", className="bg-aqua")
+                ], className="flex gap-2 mt-2"),
+            ]),
         
         ], className="flex flex-col gap-4"),
         
         html.Div([
             html.Div(id="graph-div"),
+            # Parameters and traces of the figure in graph-div, to patch it when only the selection changes
+            dcc.Store(id="graph-key"),
             html.Div(
                 id='advantages-box', 
                 className="hidden",
-            )
+            ),
+            # Competitors most similar to the JPM ETF of "Similar Competitors"
+            html.Div(id="peer-div"),
+            # Holdings overlap of the ETFs with holdings files
+            html.Div(id="overlap-div")
         ], className="w-full flex flex-col")
 
     ], className="p-8 flex gap-8"
@@ -271,24 +336,57 @@ plot_metric = {
 # Function for updating the Graph depending on the selected Graph Type and Axes
 @dash.callback(
     Output("graph-div", "children"),
+    Output("graph-key", "data"),
     Input("graph-type", "value"),
     Input("x-variable", "value"),
     Input("y-variable", "value"),
     Input("z-variable", "value"),
     Input("period", "value"),
     Input("column", "value"),
+    Input("benchmark", "value"),
     Input("selected-competitor-data", "data"),
+    State("graph-key", "data"),
     prevent_initial_call=True
 )
 def update_graph(
-    graph_type, x_variable, y_variable, z_variable, time_period, column, selection
+    graph_type, x_variable, y_variable, z_variable, time_period, column, benchmark, selection, shown
 ):
-    selected_tickers = list(map(lambda x: x[1], selection["tickers"]))
-    
+    selected_tickers = sorted(set(map(lambda x: x[1], selection["tickers"])))
+    if graph_type == "bar_chart" and y_variable is None:
+        return None, None
+    if graph_type == "time_series" and (time_period is None or column is None):
+        return None, None
+
+    # only the parameters the graph type uses, so that e.g. a change of period does not miss the cached scatter plot
+    if graph_type == "time_series":
+        parameters = [graph_type, time_period, column, benchmark if column in ANALYTICS_COLUMNS else None, data_version()]
+    else:
+        parameters = [graph_type, x_variable, y_variable, z_variable if graph_type == "scatter_3d" else None, COMPETITOR_DATA_VERSION]
+    figure = figure_cache.get(
+        (tuple(parameters), tuple(selected_tickers)),
+        lambda: build_figure(graph_type, x_variable, y_variable, z_variable, time_period, column, benchmark, selected_tickers)
+    )
+    graph_key = {"parameters": parameters, "traces": [trace.get("name") for trace in figure["data"]]}
+
+    # time series are not patched: their window ends at the latest date of the whole selection, so a change of selection
+    # can shift every line, and a zoomed chart shows resampled data (see resample_time_series) the cached traces lack
+    if shown is not None and shown["parameters"] == parameters and graph_type != "time_series":
+        # only the selection changed, the traces of the unchanged ETFs stay in the browser
+        children = Patch()
+        trace_patch(children["props"]["figure"]["data"], shown["traces"], figure["data"])
+        return children, graph_key
+
+    graph_id = "time-series-graph" if graph_type == "time_series" else "graph"
+    return dcc.Graph(id=graph_id, figure=figure, className="h-[560px] -mt-4 border-b-2 border-bronze pb-3"), graph_key
+
+def build_figure(graph_type, x_variable, y_variable, z_variable, time_period, column, benchmark, selected_tickers):
+    # one trace per ETF, in the order of selected_tickers (colors follow that order)
+    selected = df[df["Ticker"].isin(selected_tickers)].sort_values("Ticker", kind="stable")
+
     figure = {}
     if graph_type == "scatter_3d":
         figure = px.scatter_3d(
-            df[df["Ticker"].isin(selected_tickers)],
+            selected,
             x=x_variable,
             y=y_variable,
             z=z_variable,
@@ -310,7 +408,7 @@ def update_graph(
 
     elif graph_type == "scatter":
         figure = px.scatter(
-            df[df["Ticker"].isin(selected_tickers)],
+            selected,
             x=x_variable,
             y=y_variable,
             color="Ticker",
@@ -321,10 +419,8 @@ def update_graph(
         )
     
     elif graph_type == "bar_chart":
-        if y_variable is None:
-            return
         figure = px.bar(
-            df[df["Ticker"].isin(selected_tickers)],
+            selected,
             x="Ticker",
             y=y_variable,
             color="Ticker",
@@ -332,22 +428,25 @@ def update_graph(
             xaxis_title="ETF Tickers",
             yaxis_title=y_variable,
             margin={"t":0,"b":0},
+        ).update_xaxes(
+            # bars in the order of the traces, so that patching the traces is enough to add or remove an ETF
+            categoryorder="trace",
+            categoryarray=None,
         )
         
     elif graph_type == "time_series":
-        if time_period is None or column is None:
-            return
-        period = int(time_period)
         figure = go.Figure()
-        for ind, ticker in enumerate(selected_tickers):
-            etf_data = select_column(ticker, column)[:period]
-            etf_data["Date"] = pd.to_datetime(etf_data["Date"])
-            etf_trace = go.Scatter(
-                x=etf_data["Date"],
-                y=etf_data[column],
+        prices = period_prices(selected_tickers, column, time_period, benchmark)
+        for ind, (ticker, (dates, values)) in enumerate(prices.items()):
+            # about one point per pixel, the detail comes back on zoom (see resample_time_series)
+            dates, values = downsample(dates, values)
+            scatter = go.Scattergl if len(dates) > SCATTERGL_THRESHOLD else go.Scatter
+            etf_trace = scatter(
+                x=dates,
+                y=values,
                 name=ticker,
                 mode="lines",
-                line=dict(color=COLORS[ind])
+                line=dict(color=COLORS[ind % len(COLORS)])
             )
             figure.add_trace(etf_trace)
         figure.update_layout(
@@ -355,7 +454,52 @@ def update_graph(
             yaxis_title=column,
             margin={"t":0,"b":0}
         )
-    return dcc.Graph(id="graph", figure=figure, className="h-[560px] -mt-4 border-b-2 border-bronze pb-3")
+    return figure
+
+def series_store(column, benchmark):
+    # rolling analytics are charted like prices, from a store of their own
+    return get_analytics(benchmark or BENCHMARK) if column in ANALYTICS_COLUMNS else get_price_store()
+
+def period_prices(selected_tickers, column, time_period, benchmark):
+    store = series_store(column, benchmark)
+    if time_period == "all":
+        return store.window(selected_tickers, column)
+    # same calendar span for every ticker, up to the latest price of any of them
+    return store.last_days(selected_tickers, column, int(time_period))
+
+# Function for resampling the time series to the visible dates on zoom
+@dash.callback(
+    Output("time-series-graph", "figure"),
+    Input("time-series-graph", "relayoutData"),
+    State("period", "value"),
+    State("column", "value"),
+    State("benchmark", "value"),
+    State("selected-competitor-data", "data"),
+    prevent_initial_call=True
+)
+def resample_time_series(relayout_data, time_period, column, benchmark, selection):
+    selected_tickers = sorted(set(map(lambda x: x[1], selection["tickers"])))
+    relayout_data = relayout_data or {}
+
+    if "xaxis.range[0]" in relayout_data or "xaxis.range" in relayout_data:
+        start, end = relayout_data.get("xaxis.range") or (relayout_data["xaxis.range[0]"], relayout_data["xaxis.range[1]"])
+        # one more day on each side, so the lines reach the edges of the chart
+        start = np.datetime64(pd.Timestamp(start), "D") - np.timedelta64(1, "D")
+        end = np.datetime64(pd.Timestamp(end), "D") + np.timedelta64(1, "D")
+        prices = series_store(column, benchmark).window(selected_tickers, column, start, end)
+    elif relayout_data.get("xaxis.autorange"):
+        prices = period_prices(selected_tickers, column, time_period, benchmark)
+    else:
+        # e.g. a y-axis only zoom, the dates shown do not change
+        return no_update
+
+    # the traces are in the same order as in update_graph, only their points change
+    figure = Patch()
+    for ind, (dates, values) in enumerate(prices.values()):
+        dates, values = downsample(dates, values)
+        figure["data"][ind]["x"] = dates
+        figure["data"][ind]["y"] = values
+    return figure
     
 
 @dash.callback(
@@ -372,6 +516,106 @@ def hide_advantages_box(selected_ticker_indices):
     else:
         return "self-center pt-2 w-fit"
 
+# Function for showing the competitors most similar to a JPM ETF and what sets each of them apart
+@dash.callback(
+    Output("peer-div", "children"),
+    Input("peer-etf", "value"),
+    Input("peer-region", "value"),
+    Input("peer-asset-class", "value"),
+    Input("peer-count", "value"),
+    prevent_initial_call=True
+)
+def update_peers(etf, region, asset_class, count):
+    if etf is None:
+        return None
+    peers = peer_finder.nearest(etf, int(count or 5), region, asset_class)
+
+    # share of each metric in the (squared) distance of a competitor to the ETF, in %
+    column_defs = [
+        {"field": "Ticker", "pinned": "left"},
+        {"field": "Region"},
+        {"field": "Distance", "valueFormatter": {"function": "d3.format('.2f')(params.value)"}},
+    ] + [
+        {"field": metric, "headerName": f"{metric} (%)", "valueFormatter": {"function": "d3.format('.0f')(params.value)"}}
+        for metric in peer_finder.metrics
+    ]
+
+    return html.Div([
+        html.Div([
+            html.Img(src="../assets/Icons/IconCompetitor.svg", className="w-[25px] h-[25px]"),
+            html.Span(f"Competitors Similar to {etf}", className="text-[18px] font-medium")
+        ], className="flex gap-2 items-center pb-2 border-b-2 border-b-bronze mb-2"),
+        dag.AgGrid(
+            rowData=peers.to_dict("records"),
+            columnDefs=column_defs,
+            defaultColDef={"sortable": True, "minWidth": 110},
+            dashGridOptions={"domLayout": "autoHeight"},
+            style={"height": None, "width": "100%"}
+        )
+    ], className="pt-4")
+
+# Function for selecting a JPM ETF and its most similar competitors in the competitor tables
+@dash.callback(
+    Output({"type": "ticker-selection", "index": ALL }, "selected_rows"),
+    Input("peer-select-button", "n_clicks"),
+    State("peer-etf", "value"),
+    State("peer-region", "value"),
+    State("peer-asset-class", "value"),
+    State("peer-count", "value"),
+    prevent_initial_call=True
+)
+def select_peers(n_clicks, etf, region, asset_class, count):
+    if etf is None:
+        return [no_update] * len(REGIONS)
+    peers = peer_finder.nearest(etf, int(count or 5), region, asset_class)
+    funds = pd.concat([peer_finder.funds[peer_finder.funds["Ticker"] == etf], peers])
+
+    # rows of each region table, show_selected_competitors then fills selected-competitor-data from them
+    return [funds.loc[funds["Region"] == table_region, "Row"].tolist() for table_region in REGIONS]
+
+# Function for showing the holdings overlap of the selected ETFs (all ETFs with holdings if fewer than 2 of them are selected)
+@dash.callback(
+    Output("overlap-div", "children"),
+    Input({"type": "ticker-selection", "index": ALL }, "derived_virtual_selected_rows")
+)
+def update_overlap_heatmap(selected_ticker_indices):
+    weight_overlap, count_overlap = get_overlap()
+
+    selected = []
+    for region_ind, region_dt in enumerate(selected_ticker_indices):
+        for ticker_ind in region_dt or []:
+            ticker = etf_ticker(df_v2[REGIONS[region_ind]].iloc[ticker_ind]["Ticker"])
+            if ticker in weight_overlap.index and ticker not in selected:
+                selected.append(ticker)
+    if len(selected) >= 2:
+        weight_overlap = weight_overlap.loc[selected, selected]
+        count_overlap = count_overlap.loc[selected, selected]
+
+    fig = px.imshow(
+        weight_overlap,
+        text_auto=".1f",
+        aspect="auto",
+        color_continuous_scale=["#f5f7f8", "#096183"],
+        labels={"x": "ETF", "y": "ETF", "color": "Overlap (%)"},
+    )
+    fig.update_traces(
+        customdata=count_overlap.to_numpy(),
+        hovertemplate="%{y} / %{x}<br>Weight overlap: %{z:.1f}%<br>Common holdings: %{customdata}<extra></extra>",
+    )
+    fig.update_layout(margin=dict(l=0, r=0, t=0, b=0))
+
+    return html.Div([
+        html.Div([
+            html.Img(src="../assets/Icons/IconCompetitor.svg", className="w-[25px] h-[25px]"),
+            html.Span("Holdings Overlap", className="text-[18px] font-medium")
+        ], className="flex gap-2 items-center pb-2 border-b-2 border-b-bronze mb-2"),
+        dcc.Graph(
+            figure=fig,
+            config={"displayModeBar": False},
+            style={"height": f"{120 + 40 * len(weight_overlap)}px"}
+        )
+    ], className="pt-4")
+
 # Function for updating the advantages box
 @dash.callback(
     Output('advantages-box', 'children'),
@@ -391,8 +635,7 @@ def update_advantages_box(selected_ticker_indices):
     if len(ticker_values) < 2:
         return
     
-    data_frame = clean_competitor_data(df)
-    advantages = find_advantage(data_frame, ticker_values[0], ticker_values[1:])
+    advantages = find_advantage(competitor_matrix, ticker_values[0], ticker_values[1:])
 
     unbiased_metrics = ["Expense Ratio", "Beta 1Y-M", "Beta 3Y"]
     
@@ -1,5 +1,7 @@
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+from pages.price_store import get_price_store
 
 # ###x1 is JPM's ETF, x2 is target competitor's ETF
 # def find_advantage(df, x1, x2):
@@ -16,25 +18,49 @@ import matplotlib.pyplot as plt
 #     advantages = diff
 #     # advantages = diff[diff > 0]
 #     return advantages
-def find_advantage(df, x1, x2):
-    # Get data for ETF1
-    etf1 = df[df['Ticker'] == x1].iloc[0][1:]
-    etf1 = etf1[8:].astype(float)
 
-    advantages = {}
-    
-    # Calculate advantages for each competitor in x2
-    for competitor in x2:
-        etf2 = df[df['Ticker'] == competitor].iloc[0][1:]
-        etf2 = etf2[8:].astype(float)
+# Columns of the competitor data before the metrics compared by find_advantage (North, Name, ..., General Attribute)
+DESCRIPTIVE_COLUMNS = 9
+
+class CompetitorMatrix:
+    """Metrics of every ETF of the competitor data as one float matrix, with the row of each ticker
+
+    Built once from the cleaned data (see clean_competitor_data), so comparing an ETF with any number of competitors
+    is a lookup of their rows and a single broadcast instead of a scan of the data per competitor.
+    """
 
-        # Calculate percentage difference for each column
-        diff = ((etf1 - etf2) / etf1) * 100
-        diff = diff.round(2)
+    def __init__(self, df):
+        self.columns = df.columns[DESCRIPTIVE_COLUMNS:]
+        self.values = df[self.columns].to_numpy(dtype=float)
+        # First row of each ticker, as df[df['Ticker'] == ticker].iloc[0]
+        tickers = df['Ticker'].to_numpy()
+        self.rows = {ticker: row for row, ticker in reversed(list(enumerate(tickers)))}
 
-        advantages[competitor] = diff
+    def advantages(self, x1, x2):
+        """Percentage difference of each metric of x1 with each competitor in x2: (x1 - x2) / x1 * 100, rounded to 2
+        decimals
+
+        Args:
+            x1 (str): Ticker of the ETF, e.g. 'JEPI US Equity'
+            x2 (list of str): Tickers of the competitors
+
+        Returns:
+            dict of competitor ticker -> pandas Series of the difference by metric
+        """
+        etf1 = self.values[self.rows[x1]]
+        competitors = self.values[[self.rows[competitor] for competitor in x2]]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            diff = np.round((etf1 - competitors) / etf1 * 100, 2)
+        return {competitor: pd.Series(row, index=self.columns) for competitor, row in zip(x2, diff)}
+
+def find_advantage(df, x1, x2):
+    """Percentage difference of the metrics of x1 with each competitor in x2, see CompetitorMatrix.advantages
 
-    return advantages
+    Args:
+        df (pandas df or CompetitorMatrix): Cleaned competitor data, or its matrix to avoid building it on every call
+    """
+    matrix = df if isinstance(df, CompetitorMatrix) else CompetitorMatrix(df)
+    return matrix.advantages(x1, x2)
 
     
 
@@ -49,11 +75,9 @@ def clean_competitor_data(data_df):
 
 ###choose a etf and an attribute
 def select_column(etf, column):
-    file_path = 'price data/' + etf + '.csv'
-    data_df = pd.read_csv(file_path)
-    selected_columns = ['Date', column]
-    selected_data = data_df[selected_columns]
-    return selected_data
+    # from the prices loaded once by the price store, newest first as in the price files
+    dates, values = get_price_store().window([etf], column)[etf]
+    return pd.DataFrame({'Date': dates[::-1], column: values[::-1]})
 
 # def plot_timeseries(etf1, etf2, column, period=365):
 #     column = plot_metric[column]
@@ -119,13 +143,14 @@ def plot_multi_advantages(df, x1, x2_list, jpm_x1 = True):
 
 
 
-df = pd.read_csv('Competitor Data.csv')
-# print(df)
-df = clean_competitor_data(df)
+if __name__ == "__main__":
+    df = pd.read_csv('Competitor Data.csv')
+    # print(df)
+    df = clean_competitor_data(df)
 
-competitors = ['QQQ US Equity', 'SPY US Equity']
+    competitors = ['QQQ US Equity', 'SPY US Equity']
 
-advantages = find_advantage(df, 'JEPI US Equity', competitors)
-# print(advantages)
-# plot_timeseries('JEPI US Equity', 'QQQ US Equity', "Tot Asset US$ (M)")
+    advantages = find_advantage(df, 'JEPI US Equity', competitors)
+    # print(advantages)
+    # plot_timeseries('JEPI US Equity', 'QQQ US Equity', "Tot Asset US$ (M)")
 
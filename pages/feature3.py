@@ -8,6 +8,7 @@ import dash_html_components as html
 import dash_ag_grid as dag
 import plotly.express as px
 
+from pages.data_access import read_workbook
 from components.TitleWithIcon import TitleWithIcon
 from components.ETFTitle import ETFTitle
 
@@ -100,11 +101,11 @@ for i in range(num_clients):
 df = pd.DataFrame(data)
 
 RECOMMENDATIONS = ["JEPI US Equity", "JEPQ US Equity", "JIRE US Equity", "BBIN US Equity"]
-df_etfs = pd.read_excel("./static/Competitor Data_v2.xlsx", sheet_name="US Equity")
+df_etfs = read_workbook("./static/Competitor Data_v2.xlsx", sheet_name="US Equity")
 df_recommendations = df_etfs.loc[df_etfs["Ticker"].apply(lambda x: x in RECOMMENDATIONS)].reset_index()
 
-df_client_holdings = pd.read_excel("./static/Client ETF Holdings.xlsx", sheet_name=None)
-df_features = pd.read_excel("./static/ETF Recommendations and features.xlsx", sheet_name=None)
+df_client_holdings = read_workbook("./static/Client ETF Holdings.xlsx", sheet_name=None)
+df_features = read_workbook("./static/ETF Recommendations and features.xlsx", sheet_name=None)
 
 # Create the Dash app
 layout = html.Div([
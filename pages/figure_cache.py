@@ -0,0 +1,68 @@
+import json
+from collections import OrderedDict
+import plotly.io as pio
+
+# Figures of the Competitor Analysis page, built once per set of graph parameters and kept serialized in a bounded
+# least recently used cache: several users often look at the same comparisons, and a figure served from the cache skips
+# Plotly Express and the pandas filtering behind it. When only the selected ETFs change, a chart whose traces do not
+# depend on each other (scatter and bar charts, not time series) already in the browser is patched (traces of the ETFs
+# removed from the selection deleted, those of the added ETFs inserted) rather than sent again whole.
+
+# Figures kept in memory
+FIGURE_CACHE_SIZE = 64
+
+
+class FigureCache:
+    """Bounded LRU cache of figures, stored as JSON
+
+    Attributes:
+        figures (OrderedDict): Key -> JSON of the figure, least recently used first
+        size (int): Number of figures kept, the least recently used is dropped beyond it
+    """
+
+    def __init__(self, size=FIGURE_CACHE_SIZE):
+        self.figures = OrderedDict()
+        self.size = size
+
+    def get(self, key, build):
+        """Figure of a key, from the cache or from build() (then cached)
+
+        Args:
+            key (hashable): Everything the figure depends on, including a version of its data
+            build (function): Returns the figure (plotly Figure or dict) when it is not cached
+
+        Returns:
+            dict of the figure, a fresh copy on every call
+        """
+        if key in self.figures:
+            self.figures.move_to_end(key)
+        else:
+            self.figures[key] = pio.to_json(build(), validate=False)
+            if len(self.figures) > self.size:
+                self.figures.popitem(last=False)
+        return json.loads(self.figures[key])
+
+
+def trace_patch(data, shown, traces):
+    """Patch the traces of a chart in the browser into the traces of a figure
+
+    Traces are matched by name and must be in the same order in both: those no longer in the figure are deleted, the new
+    ones inserted, and the colors of those that moved are updated (colors follow the position of a trace). Traces that
+    stay are not sent again.
+
+    Args:
+        data (dash Patch): Location of the traces of the chart, e.g. Patch()["props"]["figure"]["data"]
+        shown (list of str): Names of the traces of the chart, in order
+        traces (list of dict): Traces of the figure
+    """
+    names = [trace.get("name") for trace in traces]
+    for index in reversed(range(len(shown))):
+        if shown[index] not in names:
+            del data[index]
+    for index, trace in enumerate(traces):
+        if names[index] not in shown:
+            data.insert(index, trace)
+        elif shown.index(names[index]) != index:
+            for part in ("marker", "line"):
+                if "color" in trace.get(part, {}):
+                    data[index][part]["color"] = trace[part]["color"]
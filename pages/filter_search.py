@@ -1,45 +1,101 @@
+import os
+import sys
+import json
+import hashlib
 import pandas as pd
 import fasttext
 import fasttext.util
 import numpy as np
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
+from pages.constituent_data import load_constituents, preprocess_all_constituents
+from pages.compact_embeddings import CompactEmbeddings, compact_store_exists, COMPACT_DIR
+from pages.constituent_index import ConstituentIndex, INDEX_PATH
+from pages.search_cache import SearchCache
+from pages.bm25_index import BM25Index
+from pages.security_master import SecurityMaster, EMBEDDING_DIR as SECURITY_EMBEDDING_DIR
 fasttext.FastText.eprint = lambda x: None
-# The following lines must be ran once locally
-nltk.download('stopwords')
-nltk.download('punkt')
+# The NLTK stopwords are only needed to preprocess the constituent descriptions (see constituent_data.py), which happens
+# offline or when a constituents file changed, and are downloaded there if missing
 
 # NOTE: You must download the model, for this code currently, the model is downloaded via:
 # "fasttext.util.download_model('en', if_exists='ignore')"
 # I (Adi) have it on my local machine, the file is 7gigs so I havent pushed it to the repo
 # The file is in the home directory of the repo, named 'cc.en.300.bin'
 
-print('Checking if model downloaded')
-# fasttext.util.download_model('en', if_exists='ignore')
-# print('Model detected')
-#
-# print('Loading model')
-# ft = fasttext.load_model('cc.en.300.bin')
+# The model is only needed to embed search queries (and to build the constituent embeddings), so it is loaded on first use.
+# The compact store ('pages/data/compact_model', see compact_embeddings.py) is used when it has been built, the full model otherwise
+ft = None
+model_unavailable = False # Set when loading the model failed, the keyword search then falls back to the lexical mode
+MODEL_FILE = 'cc.en.300.bin'
 
-print('Loading stopwords')
-stop_words = set(stopwords.words('english'))  # Set of English stopwords
-print('Stopwords loaded')
+def load_model(download=False):
+    """Load the embedding model the first time it is needed
 
-# Function to remove stopwords from a text string
-# Input:
-def remove_stopwords(text):
-    """Remove stopwords from a text string
+    The full model is never downloaded by the dashboard (7 GB): without the compact store or a local copy of the model,
+    the model is unavailable and the keyword search falls back to the lexical mode.
 
     Args:
-        text (str): Text
+        download (bool): Download the full model if there is no local copy, for the offline steps only
+
+    Returns:
+        CompactEmbeddings if the compact store exists, otherwise the full fastText model
+    """
+    global ft
+    if ft is None:
+        if compact_store_exists():
+            print('Loading compact model')
+            ft = CompactEmbeddings()
+            return ft
+
+        if not os.path.exists(MODEL_FILE):
+            if not download:
+                raise FileNotFoundError(f'Neither the compact store nor {MODEL_FILE} exist, see compact_embeddings.py')
+            print('Downloading model')
+            fasttext.util.download_model('en', if_exists='ignore')
+
+        print('Loading model')
+        ft = fasttext.load_model(MODEL_FILE)
+    return ft
+
+def model_available():
+    """Whether the embedding model can be loaded, a failed load is not retried
+
+    Returns:
+        bool
+    """
+    global model_unavailable
+    if ft is None and not model_unavailable:
+        try:
+            load_model()
+        except (OSError, ValueError) as error: # Download failed (e.g. offline) or the model file is missing/corrupt
+            print(f'Embedding model unavailable: {error}')
+            model_unavailable = True
+    return not model_unavailable
+
+def load_constituent_vocabulary():
+    """Collect every word the search can meet in the constituent data: descriptions (without stopwords), sectors, industries
+    and the ETF categories of the filter page
 
     Returns:
-        String with stopwords removed
+        Set of words
     """
-    tokens = word_tokenize(text)  # Tokenize the text into words
-    filtered_tokens = [word for word in tokens if word.lower() not in stop_words]  # Remove stopwords
-    return ' '.join(filtered_tokens)  # Join the filtered tokens back into a string
+    vocabulary = set()
+    for file in sorted(os.listdir('./pages/data')):
+        if file.endswith('_constituents.csv'):
+            source_df = load_constituents(file[:-len('_constituents.csv')]).dropna()
+            for description in source_df['Clean Description']:
+                vocabulary.update(description.split())
+            for column in ['Sector', 'Industry']:
+                for value in source_df[column].unique():
+                    vocabulary.update(value.split())
+
+    with open('./static/ETF_categories.json') as file:
+        categories = json.load(file)
+    for parent, sub_categories in categories.items():
+        for category in [parent] + sub_categories:
+            vocabulary.update(category.split())
+            vocabulary.update(category.lower().split())
+
+    return vocabulary
 
 
 # Calculate the cosine similarity of two vectors
@@ -49,39 +105,233 @@ cos_similarity = lambda a, b: np.dot(a, b)/(np.linalg.norm(a)*np.linalg.norm(b))
 # fasttext.util.reduce_model(ft, 100)
 # print(ft.get_dimension())
 
-def find_top_const(etf, query, file_output=False, prnt=False, return_res=False):
+# Unique securities of all ETFs and their embeddings (see security_master.py), loaded on first use. Descriptions are
+# embedded once per security, an ETF's embedding matrix is the rows of its securities
+EMBEDDING_DIR = SECURITY_EMBEDDING_DIR
+_security_master = None
+
+def get_security_master():
+    global _security_master
+    if _security_master is None:
+        _security_master = SecurityMaster.load()
+    return _security_master
+
+def build_embeddings():
+    """Embed the description of every unique security and save the matrix to disk, only added or changed descriptions
+    are embedded again
+
+    Returns:
+        numpy array of shape (number of securities, model dimension)
+    """
+    return get_security_master().build_vectors(load_model(), EMBEDDING_DIR)
+
+def build_all_embeddings():
+    """Bring everything derived from the constituents files of 'pages/data' up to date: preprocessed descriptions,
+    security master, embeddings and cross-ETF index. Each step reports how much it recomputed and reused
+    """
+    preprocess_all_constituents()
+    build_embeddings()
+    get_constituent_index()
+
+def security_vectors():
+    """Embedding matrix of the securities (one unit length row per security_id), built if missing or outdated (i.e. a
+    constituents CSV was regenerated)
+    """
+    master = get_security_master()
+    if not master.load_vectors(load_model(), EMBEDDING_DIR):
+        print('Security embeddings missing or outdated, updating')
+        build_embeddings()
+    return master.vectors
+
+def load_search_constituents(etf):
+    """Constituents of an ETF searched (rows with NaN values removed) and the security_id of each of them
+
+    Args:
+        etf (str): ETF ticker, e.g. 'JEPI'
+
+    Returns:
+        Tuple of the preprocessed constituents DataFrame and a numpy array of security ids, see SecurityMaster.constituents
+    """
+    return get_security_master().constituents(etf)
+
+def embed_query(query):
+    """Embed a search query as a unit length vector
+
+    Args:
+        query (str): Search query from sales
+
+    Returns:
+        numpy array of the model dimension
+    """
+    vector = load_model().get_sentence_vector(query)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+def preload(tickers):
+    """Load the model, the embeddings of some ETFs and the BM25 index ahead of the first search
+
+    Searches run in background job processes forked from the server (see dashboard.py), which then start with
+    everything loaded here instead of loading it again for every job.
+
+    Args:
+        tickers (list of str): ETF tickers, e.g. SUPPORTED_TICKERS
+    """
+    get_bm25_index()
+    for etf in tickers:
+        load_search_constituents(etf)
+    if model_available():
+        security_vectors()
+
+# Cross-ETF index over the constituents of every ETF in 'pages/data', built on first use
+_constituent_index = None
+
+def get_constituent_index():
+    global _constituent_index
+    if _constituent_index is None:
+        _constituent_index = ConstituentIndex.build(get_security_master(), security_vectors())
+    return _constituent_index
+
+def search_all_constituents(keyword, k=10, exact=False):
+    """Find the constituents most similar to a keyword across all ETFs, not only the supported tickers
+
+    Args:
+        keyword (str): Search query from sales
+        k (int): Number of results
+        exact (bool): Brute force search instead of the approximate index, to validate recall
+
+    Returns:
+        pandas df of 'Symbol', 'Company', 'Sector', 'Industry', 'ETFs' (tickers holding it) and 'Cosine Similarity'
+    """
+    return get_constituent_index().search(embed_query(keyword), k, exact=exact)
+
+# Lexical index over the descriptions of the unique securities, built on first use (see bm25_index.py)
+_bm25_index = None
+
+def get_bm25_index():
+    global _bm25_index
+    if _bm25_index is None:
+        _bm25_index = BM25Index.build(get_security_master())
+    return _bm25_index
+
+# Constituents less similar than SIMILARITY_THRESHOLD to the query do not count towards the ETF score. TOP_K optionally
+# keeps only the k most similar constituents of each ETF (None keeps every constituent above the threshold)
+SIMILARITY_THRESHOLD = 0.31
+TOP_K = None
+
+def select_matches(cos_sim, threshold=SIMILARITY_THRESHOLD, top_k=TOP_K):
+    """Zero the similarities below the threshold and, if top_k is set, outside the top k of each query
+
+    Args:
+        cos_sim (numpy array): Similarities, one row per constituent (and one column per query for several queries)
+        threshold (float): Minimum similarity kept
+        top_k (int): Number of most similar constituents kept per query, None to keep all of them
+
+    Returns:
+        numpy array of the same shape
+    """
+    selected = np.where(cos_sim > threshold, cos_sim, 0)
+    if top_k is not None and top_k < len(selected):
+        # Partial selection: everything before the (n - top_k)th smallest value is dropped, no full sort needed
+        dropped = np.argpartition(selected, len(selected) - top_k, axis=0)[:len(selected) - top_k]
+        np.put_along_axis(selected, dropped, 0, axis=0)
+    return selected
+
+def find_top_const(etf, query, prnt=False, return_res=False, query_vector=None, threshold=SIMILARITY_THRESHOLD, top_k=TOP_K, security_scores=None):
     """Given an ETF and a search query, find the top 10 constituents of the ETF that are most similar to the query
 
     Args:
-        etf (pandas df): Consists of an ETF's constituents, their 'Description', 'Sector', 'Industry', and 'Weights'
+        etf (str): ETF ticker, its constituents ('Description', 'Sector', 'Industry', 'Weights') security ids are loaded via load_search_constituents
         query (string): Search query from sales
-        file_output (bool): Whether or not to output the results to a CSV file
         prnt (bool): Whether or not to print the results to the console
         return_res: Whether or not to return the results
+        query_vector (numpy array): Embedding of the query, computed from the query if not given
+        threshold (float): Minimum cosine similarity of a matching constituent
+        top_k (int): Number of most similar constituents kept, None to keep all of them above the threshold
+        security_scores (numpy array): Cosine similarity of the query to every security (security_vectors() @ query_vector),
+            to share it between ETFs; computed for the constituents of this ETF only if not given
     """
+    constituents, security_ids = load_search_constituents(etf)
+    if security_scores is not None:
+        cos_sim = security_scores[security_ids]
+    else:
+        if query_vector is None:
+            query_vector = embed_query(query)
+        cos_sim = security_vectors()[security_ids] @ query_vector
 
-    for idx, row in etf.iterrows():
-        cos_sim = cos_similarity(ft.get_sentence_vector(query), ft.get_sentence_vector(row['Description']))
-        etf.loc[idx, 'Cosine Similarity'] = cos_sim if cos_sim > 0.31 else 0
+    etf_df = constituents.copy()
+    etf_df['Cosine Similarity'] = select_matches(cos_sim, threshold, top_k)
 
-        # Optional for future use
-        # etf.loc[idx, 'Sector Similarity'] = cos_similarity(ft.get_sentence_vector(query), ft.get_sentence_vector(row['Sector']))
-        # etf.loc[idx, 'Industry Similarity'] = cos_similarity(ft.get_sentence_vector(query), ft.get_sentence_vector(row['Industry']))
-
-
-    # Output the sorted results to a CSV file
-    if file_output == True:
-        etf.sort_values(by='Cosine Similarity', ascending=False).to_csv(f'pages/data/JPM_{query}.csv', index=False)
+    # Optional for future use
+    # etf_df['Sector Similarity'] = cos_similarity(query_vector, ft.get_sentence_vector(row['Sector']))
+    # etf_df['Industry Similarity'] = cos_similarity(query_vector, ft.get_sentence_vector(row['Industry']))
 
     # Print the top 10 results' Names, Weights, and Cosine Similarity
     if prnt == True:
-        # print(etf.sort_values(by='Cosine Similarity', ascending=False).head(10)) # Print all columns
-        print(etf.sort_values(by='Cosine Similarity', ascending=False).head(10)[['Company', 'Weights', 'Cosine Similarity']])
+        # print(etf_df.sort_values(by='Cosine Similarity', ascending=False).head(10)) # Print all columns
+        print(etf_df.sort_values(by='Cosine Similarity', ascending=False).head(10)[['Company', 'Weights', 'Cosine Similarity']])
 
     if return_res == True:
-        etf_sorted = etf.sort_values(by='Cosine Similarity', ascending=False)[['Company', 'Weights', 'Cosine Similarity']]
+        etf_sorted = etf_df.sort_values(by='Cosine Similarity', ascending=False)[['Company', 'Weights', 'Cosine Similarity']]
         return etf_sorted
 
+# Keyword search modes:
+# - semantic: cosine similarity of the embeddings of the query and of every constituent description
+# - lexical: BM25 score of the query terms in the descriptions, no embedding model needed
+# - hybrid: BM25 keeps the HYBRID_CANDIDATES best matching constituents of each ETF, only those are reranked by embeddings
+SEARCH_MODES = ['semantic', 'hybrid', 'lexical']
+HYBRID_CANDIDATES = 100
+
+# Name of the similarity column of the search results in each mode (BM25 scores are normalised to [0, 1))
+SIMILARITY_COLUMNS = {'semantic': 'Cosine Similarity', 'hybrid': 'Cosine Similarity', 'lexical': 'BM25 Similarity'}
+
+def resolve_search_mode(mode):
+    """Search mode actually used: the modes needing embeddings fall back to lexical when the model cannot be loaded
+
+    Args:
+        mode (str): One of SEARCH_MODES
+
+    Returns:
+        str
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f'Unknown search mode {mode}, expected one of {SEARCH_MODES}')
+    if mode != 'lexical' and not model_available():
+        print(f'Falling back to lexical search instead of {mode}')
+        return 'lexical'
+    return mode
+
+def find_top_const_bm25(etf, bm25_scores, query_vector=None, threshold=SIMILARITY_THRESHOLD, top_k=TOP_K):
+    """Lexical and hybrid counterpart of find_top_const
+
+    Without a query vector the BM25 scores are the similarity (lexical mode), every constituent matching a query term
+    counts. With one, the best BM25 candidates are reranked by cosine similarity (hybrid mode) and the other
+    constituents get a similarity of 0.
+
+    Args:
+        etf (str): ETF ticker
+        bm25_scores (numpy array): Scores of the query for every security, see BM25Index.score
+        query_vector (numpy array): Embedding of the query for the hybrid mode, None for the lexical mode
+        threshold (float): Minimum cosine similarity of a matching constituent (hybrid mode only)
+        top_k (int): Number of most similar constituents kept, None to keep all of them above the threshold
+
+    Returns:
+        pandas df of 'Company', 'Weights' and the similarity column of the mode (see SIMILARITY_COLUMNS), sorted by similarity
+    """
+    constituents, security_ids = load_search_constituents(etf)
+    etf_scores = bm25_scores[security_ids]
+    if query_vector is None:
+        column = SIMILARITY_COLUMNS['lexical']
+        similarity = select_matches(etf_scores, 0, top_k)
+    else:
+        column = SIMILARITY_COLUMNS['hybrid']
+        rows = get_bm25_index().candidates(etf_scores, HYBRID_CANDIDATES)
+        similarity = np.zeros(len(constituents), dtype=np.float32)
+        similarity[rows] = select_matches(security_vectors()[security_ids[rows]] @ query_vector, threshold, top_k)
+
+    etf_df = constituents[['Company', 'Weights']].copy()
+    etf_df[column] = similarity
+    return etf_df.sort_values(by=column, ascending=False)
+
 def main():
     print('Currently supported ETFs: BBIN, DFAC, JEPI, JEPQ, JPST, JQUA, QQQ ')
 
@@ -89,25 +339,18 @@ def main():
     etf_list = etf_input.split(' ') # Split the input into a list of ETFs
     term = input("Input a search query: ")
     printb = input("Print results? (y/n): ")
-    fileb = input("Output results to CSV? (y/n): ")
 
     scores = []
 
     for etf in etf_list:
         print(f'Analyzing ETF: {etf}')
 
-        source_df = pd.read_csv(f'pages/data/{etf}_constituents.csv')
-        source_df.dropna(inplace=True) # Useless for filter, and causes errors (Removes rows with NaN descriptions)
-        source_df['Description'] = source_df['Description'].apply(remove_stopwords)
-
-        find_top_const(source_df,
-                       term,
-                       True if fileb == 'y' else False,
-                       True if printb == 'y' else False)
+        source_df = find_top_const(etf,
+                                   term,
+                                   True if printb == 'y' else False,
+                                   return_res=True)
 
-        etf_score = 0
-        for _, row in source_df.iterrows():
-            etf_score += float(row['Cosine Similarity']) * float(row['Weights'].strip('%'))
+        etf_score = source_df['Weights'].to_numpy() @ source_df['Cosine Similarity'].to_numpy()
 
         scores.append([etf,etf_score])
 
@@ -116,45 +359,149 @@ def main():
         print(f'ETF {score[0]} score: {score[1]} for search term: {term}')
 
 
-def get_ETF_similarity(tickers: list[str], keyword: str):
+# Results of get_ETF_similarity, persisted so repeated keywords are answered from disk across restarts and workers
+SEARCH_CACHE_DIR = './pages/data/cache/search'
+search_cache = SearchCache(max_size=256, path=SEARCH_CACHE_DIR)
+
+def data_version():
+    """Identifier of the data the search depends on: constituents files, embeddings and the compact model
+
+    Any regenerated file changes the version, so cached results computed from older data are no longer used. The
+    constituent index (and its files being written) is left out: it is saved again whenever its clustering is updated,
+    and keyword search results do not depend on it.
+
+    Returns:
+        str
+    """
+    files = [os.path.join('./pages/data', file) for file in os.listdir('./pages/data') if file.endswith('_constituents.csv')]
+    for directory in [EMBEDDING_DIR, COMPACT_DIR]:
+        if os.path.isdir(directory):
+            files += [os.path.join(directory, file) for file in os.listdir(directory)
+                      if not file.startswith(os.path.basename(INDEX_PATH))]
+
+    stamp = hashlib.sha256()
+    for file in sorted(files):
+        stat = os.stat(file)
+        stamp.update(f'{file}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+    return stamp.hexdigest()[:16]
+
+def get_ETF_similarity(tickers: list[str], keyword: str, threshold=SIMILARITY_THRESHOLD, top_k=TOP_K, progress=None, mode='semantic'):
+    """Score ETFs by the weighted similarity of their constituents to a keyword
+
+    Args:
+        tickers (list of str): ETF tickers, e.g. SUPPORTED_TICKERS
+        keyword (str): Search query from sales
+        threshold (float): Minimum cosine similarity of a matching constituent
+        top_k (int): Number of most similar constituents kept per ETF, None to keep all of them above the threshold
+        progress (function): Called as progress(number of ETFs done, number of ETFs, ticker) after each ETF
+        mode (str): One of SEARCH_MODES, the lexical mode is used instead if the embedding model cannot be loaded
+
+    Returns:
+        Tuple of a dict of ETF ticker -> score and a dict of ETF ticker -> DataFrame of 'Company', 'Weights' and
+        the similarity (column named after the mode, see SIMILARITY_COLUMNS) of its constituents, sorted by similarity
+    """
+    mode = resolve_search_mode(mode)
+    cache_key = SearchCache.make_key(keyword, tickers, data_version(), threshold, top_k, mode)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        scores, constituent_similarity = cached
+        # Results are keyed on the ticker set, return them in the order asked for
+        if progress is not None:
+            progress(len(tickers), len(tickers), tickers[-1])
+        return {etf: scores[etf] for etf in tickers}, constituent_similarity
+
+    scores, constituent_similarity = score_ETFs(tickers, keyword, threshold, top_k, progress, mode)
+    search_cache.put(cache_key, (scores, constituent_similarity))
+    return scores, constituent_similarity
+
+def score_ETFs(tickers, keyword, threshold=SIMILARITY_THRESHOLD, top_k=TOP_K, progress=None, mode='semantic'):
+    """Uncached search of get_ETF_similarity, the mode must be available (see resolve_search_mode)"""
     scores = {}
 
+    # The keyword is embedded and/or scored against the BM25 index once, each ETF then only reads the rows of its securities
+    query_vector = embed_query(keyword) if mode != 'lexical' else None
+    bm25_scores = get_bm25_index().score(keyword) if mode != 'semantic' else None
+    # Each unique security is scored once, however many of the ETFs hold it
+    security_scores = security_vectors() @ query_vector if mode == 'semantic' else None
+    column = SIMILARITY_COLUMNS[mode]
+
     constituent_similarity = {}
-    for etf in tickers:
+    for done, etf in enumerate(tickers, start=1):
         # print(f'Analyzing ETF: {etf}')
 
-        source_df = pd.read_csv(f'./pages/data/{etf}_constituents.csv')
-        source_df.dropna(inplace=True) # Useless for filter, and causes errors (Removes rows with NaN descriptions)
-        source_df['Description'] = source_df['Description'].apply(remove_stopwords)
-
-        source_df_processed = find_top_const(source_df, keyword, return_res=True)
-        constituent_similarity[etf] = source_df_processed.to_dict()
+        if mode == 'semantic':
+            source_df_processed = find_top_const(etf, keyword, return_res=True, threshold=threshold, top_k=top_k, security_scores=security_scores)
+        else:
+            source_df_processed = find_top_const_bm25(etf, bm25_scores, query_vector, threshold=threshold, top_k=top_k)
+        constituent_similarity[etf] = source_df_processed.reset_index(drop=True)
         # print(source_df_processed)
 
-        etf_score = 0
-        for _, row in source_df_processed.iterrows():
-            etf_score += float(row['Cosine Similarity']) * float(row['Weights'].strip('%'))
+        # Weighted score: dot product of the weights (parsed once when the constituents are loaded) and the similarities
+        scores[etf] = float(source_df_processed['Weights'].to_numpy() @ source_df_processed[column].to_numpy())
 
-        scores[etf] = etf_score
+        if progress is not None:
+            progress(done, len(tickers), etf)
 
     # print(scores)
     return scores, constituent_similarity
 
 
+def get_theme_similarity(tickers: list[str], keywords: list[str], threshold=SIMILARITY_THRESHOLD, top_k=TOP_K):
+    """Score several themes against several ETFs in one pass: every keyword is embedded once and the embeddings of the
+    unique securities are multiplied once with all the keyword vectors, each ETF then takes the rows of its securities
+
+    Args:
+        tickers (list of str): ETF tickers, e.g. SUPPORTED_TICKERS
+        keywords (list of str): Themes, e.g. ["AI", "clean energy", "healthcare"]
+        threshold (float): Minimum cosine similarity of a matching constituent
+        top_k (int): Number of most similar constituents kept per theme, None to keep all of them above the threshold
+
+    Without the embedding model, the themes are scored like the lexical search: the similarity of a constituent is its
+    BM25 score, and every constituent matching a term of the theme counts.
+
+    Returns:
+        Tuple of a themes x ETFs DataFrame of weighted scores (same score as get_ETF_similarity) and a dict of
+        ETF ticker -> DataFrame of 'Company', 'Weights' and the cosine similarity of each constituent to each theme
+    """
+    if model_available():
+        query_matrix = np.array([embed_query(keyword) for keyword in keywords])
+        security_scores = security_vectors() @ query_matrix.T
+    else:
+        print('Falling back to lexical theme scores')
+        security_scores = np.stack([get_bm25_index().score(keyword) for keyword in keywords], axis=1)
+        threshold = 0
+
+    scores = {}
+    constituent_similarity = {}
+    for etf in tickers:
+        constituents, security_ids = load_search_constituents(etf)
+        cos_sim = select_matches(security_scores[security_ids], threshold, top_k)
+
+        scores[etf] = constituents['Weights'].to_numpy() @ cos_sim
+        constituent_similarity[etf] = pd.concat(
+            [constituents[['Company', 'Weights']], pd.DataFrame(cos_sim, columns=keywords)], axis=1
+        )
+
+    return pd.DataFrame(scores, index=keywords), constituent_similarity
+
+
 # while run == True:
 if __name__ == "__main__":
+    # Offline step: "python -m pages.filter_search --build-embeddings" from the home directory of the repo
+    if '--build-embeddings' in sys.argv:
+        load_model(download=True)
+        build_all_embeddings()
+        sys.exit()
+
     # Count the number of unique words in the model
-    df = pd.read_csv(f'./pages/data/JPST_constituents.csv')
+    df = load_constituents('JPST')
     df = df.dropna()
-    df['Description'] = df['Description'].apply(remove_stopwords)
     # Create set of unique words
     unique_words = set()
-    # Loop through each row of the dataframe
-    for _, row in df.iterrows():
-        # Tokenize the description
-        tokens = word_tokenize(row['Description'])
+    # Loop through each preprocessed description
+    for description in df['Clean Description']:
         # Add the tokens to the set of unique words
-        unique_words.update(tokens)
+        unique_words.update(description.split())
 
     print(len(unique_words))
 
@@ -1,59 +1,211 @@
-# Generally just for Adi's use to generate constituent files, feel free to ask how to use it if needed 
-import pandas as pd
-import numpy as np
+# Generally just for Adi's use to generate constituent files, feel free to ask how to use it if needed
+# Run from the home directory of the repo, e.g. "python -m pages.find_constituents DFAC JEPI", see --help for the options
+import os
 import csv
-import requests
-
-import yfinance as yf
+import sys
+import json
+import time
+import argparse
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 
+# Fields of the company overview saved for each constituent: CSV column -> key of the provider's overview
+FIELDS = {"Company": "longName", "Description": "longBusinessSummary", "Sector": "sector", "Industry": "industry"}
+HEADERS = ["Symbol", "Company", "Description", "Sector", "Industry", "Weights"]
+
+# Overview of every symbol fetched so far, one JSON file per symbol, so a symbol is only fetched once for all ETFs
+OVERVIEW_CACHE_DIR = './pages/data/cache/overviews'
+
 # stock = yf.Ticker("AAPL")
 # print(stock.info)
 
 def get_company_overview(symbol):
+    """Company overview of a symbol from Yahoo Finance (the default provider)
+
+    Args:
+        symbol (str): Ticker, e.g. 'AAPL'
+
+    Returns:
+        dict of the overview, with the keys of FIELDS among others
+    """
+    import yfinance as yf
+
     stock = yf.Ticker(symbol)
     return stock.info
 
-def save_to_csv(etf_symbol, constituents, weights):
-    headers = ["Symbol", "Company", "Description", "Sector", "Industry", "Weights"]
-    rows = []
+def load_provider(name):
+    """Provider of company overviews: 'yahoo', or 'module:function' of any function with the signature of
+    get_company_overview (e.g. a local fake standing in for Yahoo)
+    """
+    if name == 'yahoo':
+        return get_company_overview
+    module, function = name.split(':')
+    return getattr(importlib.import_module(module), function)
+
+
+class RateLimiter:
+    """Spaces out calls shared by several threads to at most `rate` per second"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_call = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_call - now
+            self.next_call = max(now, self.next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def cache_file(symbol, cache_dir=OVERVIEW_CACHE_DIR):
+    # Symbols like 'BRK/B' are not valid file names
+    return os.path.join(cache_dir, symbol.replace('/', '_') + '.json')
+
+def read_cached_overview(symbol, cache_dir=OVERVIEW_CACHE_DIR):
+    try:
+        with open(cache_file(symbol, cache_dir)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def write_cached_overview(symbol, overview, cache_dir=OVERVIEW_CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_file = f'{cache_file(symbol, cache_dir)}.{threading.get_ident()}.tmp'
+    with open(tmp_file, 'w') as file:
+        json.dump(overview, file)
+    os.replace(tmp_file, cache_file(symbol, cache_dir))
+
+def is_complete(fields):
+    """Whether the provider had every field of an overview, incomplete overviews are fetched again on the next run"""
+    return all(fields.get(column, "N/A") != "N/A" for column in FIELDS)
 
-    for symbol in constituents:
-        print(f'Retrieving data for {symbol}')
+def fetch_overview(symbol, provider, limiter, retries=3, backoff=1.0, cache_dir=OVERVIEW_CACHE_DIR, refresh=False):
+    """Fields of a symbol's overview, from the cache or the provider
+
+    Args:
+        symbol (str): Ticker
+        provider (function): Symbol -> overview dict, see get_company_overview
+        limiter (RateLimiter): Shared by every thread calling the provider
+        retries (int): Number of attempts after the first failed one
+        backoff (float): Seconds to wait before the first retry, doubled after each attempt
+        cache_dir (str): Directory of the cached overviews
+        refresh (bool): Ignore the cached overview
+
+    Only complete overviews are cached: a field the provider did not have (e.g. a temporary gap) is asked for again.
+
+    Returns:
+        dict of CSV column -> value ('N/A' if the provider does not have it), None if every attempt failed
+    """
+    if not refresh:
+        cached = read_cached_overview(symbol, cache_dir)
+        # overviews cached incomplete by earlier versions are fetched again too
+        if cached is not None and is_complete(cached):
+            return cached
+
+    for attempt in range(retries + 1):
+        limiter.wait()
         try:
-            overview = get_company_overview(symbol)
-            company = overview['longName']
-            description = overview['longBusinessSummary']
-            sector = overview['sector']
-            industry = overview['industry']
-            weight = weights[constituents.index(symbol)]
-            rows.append([symbol, company, description, sector, industry, weight])
-        except:
-            rows.append([symbol, "N/A", "N/A", "N/A", "N/A", "N/A"])
+            overview = provider(symbol)
+            break
+        except Exception as error:
+            if attempt == retries:
+                print(f'Failed to retrieve data for {symbol}: {error}')
+                return None
+            time.sleep(backoff * 2 ** attempt)
 
-    with open(f"pages/data/{etf_symbol}_constituents.csv", "w", newline="") as file:
-        writer = csv.writer(file)
-        writer.writerow(headers)
-        writer.writerows(rows)
+    fields = {column: overview.get(key) or "N/A" for column, key in FIELDS.items()}
+    if is_complete(fields):
+        write_cached_overview(symbol, fields, cache_dir)
+    return fields
 
-    print(f"CSV file '{etf_symbol}_constituents.csv' has been created.")
+def fetch_overviews(symbols, provider=get_company_overview, workers=8, rate=5, **kwargs):
+    """Fetch the overviews of several symbols on a bounded thread pool
+
+    Args:
+        symbols (list of str): Tickers
+        provider (function): Symbol -> overview dict, see get_company_overview
+        workers (int): Number of threads
+        rate (float): Maximum number of provider calls per second, 0 for no limit
+        **kwargs: Passed to fetch_overview (retries, backoff, cache_dir, refresh)
 
-# Replace with the ETF symbol you want to retrieve constituents for
-print('ETF Options: BBIN, DFAC, JEPI, JEPQ, JPST, JQUA, QQQ')
-etf_symbol = input("Enter ETF symbol: ")
+    Returns:
+        dict of symbol -> fields (None if the symbol could not be retrieved)
+    """
+    limiter = RateLimiter(rate)
+    symbols = list(dict.fromkeys(symbols))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        overviews = executor.map(lambda symbol: fetch_overview(symbol, provider, limiter, **kwargs), symbols)
+        results = {}
+        for done, (symbol, fields) in enumerate(zip(symbols, overviews), start=1):
+            results[symbol] = fields
+            print(f'Retrieved data for {symbol} ({done}/{len(symbols)})')
+    return results
 
-# constituents = get_etf_constituents(etf_symbol, api_key)
-# save_to_csv(etf_symbol, constituents, api_key)
+def existing_overviews(etf_symbol):
+    """Fields of the constituents already retrieved in the current '{etf_symbol}_constituents.csv' (complete rows only)"""
+    path = f"pages/data/{etf_symbol}_constituents.csv"
+    if not os.path.exists(path):
+        return {}
+    existing = pd.read_csv(path).dropna(subset=["Symbol"] + list(FIELDS)).drop_duplicates("Symbol")
+    return {row["Symbol"]: {column: row[column] for column in FIELDS} for _, row in existing.iterrows()}
 
-df = pd.read_csv(f"pages/data/{etf_symbol}_Holdings.csv")
+def save_to_csv(etf_symbol, constituents, weights, provider=get_company_overview, **kwargs):
+    """Write '{etf_symbol}_constituents.csv': the overview of every constituent with its weight, in holdings order
 
-constituents = df['Ticker'].tolist()
-weights = df['Weight'].tolist()
-print(constituents)
-print(df)
-save_to_csv(etf_symbol, constituents, weights)
-# info = stock.fast_info
+    Constituents already complete in the current file are kept as they are, only the missing ones are fetched.
 
+    Args:
+        etf_symbol (str): ETF ticker
+        constituents (list of str): Tickers of the holdings
+        weights (list): Weight of each holding, same order as constituents
+        provider (function): Symbol -> overview dict, see get_company_overview
+        **kwargs: Passed to fetch_overviews (workers, rate, retries, backoff, cache_dir, refresh)
+    """
+    overviews = {} if kwargs.get('refresh') else existing_overviews(etf_symbol)
+    # Blank tickers (e.g. cash lines) cannot be fetched
+    missing = [symbol for symbol in constituents if isinstance(symbol, str) and symbol not in overviews]
+    print(f'{etf_symbol}: {len(constituents) - len(missing)} constituents already retrieved, {len(set(missing))} to fetch')
+    overviews.update(fetch_overviews(missing, provider, **kwargs))
+
+    rows = []
+    for symbol, weight in zip(constituents, weights):
+        fields = overviews.get(symbol)
+        if fields is None:
+            rows.append([symbol, "N/A", "N/A", "N/A", "N/A", weight])
+        else:
+            rows.append([symbol] + [fields[column] for column in FIELDS] + [weight])
+
+    with open(f"pages/data/{etf_symbol}_constituents.csv", "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(HEADERS)
+        writer.writerows(rows)
+
+    print(f"CSV file '{etf_symbol}_constituents.csv' has been created.")
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate 'pages/data/{ETF}_constituents.csv' from '{ETF}_Holdings.csv'")
+    parser.add_argument("etfs", nargs="+", help="ETF tickers, e.g. BBIN DFAC JEPI JEPQ JPST JQUA QQQ")
+    parser.add_argument("--workers", type=int, default=8, help="number of concurrent requests")
+    parser.add_argument("--rate", type=float, default=5, help="maximum requests per second, 0 for no limit")
+    parser.add_argument("--retries", type=int, default=3, help="retries of a failed request")
+    parser.add_argument("--backoff", type=float, default=1.0, help="seconds before the first retry, doubled after each one")
+    parser.add_argument("--refresh", action="store_true", help="fetch every constituent again, ignoring the existing file and cache")
+    parser.add_argument("--cache-dir", default=OVERVIEW_CACHE_DIR, help="directory of the cached overviews")
+    parser.add_argument("--provider", default="yahoo", help="'yahoo' or 'module:function' returning the overview of a symbol")
+    args = parser.parse_args(argv)
 
+    provider = load_provider(args.provider)
+    for etf_symbol in args.etfs:
+        # constituents = get_etf_constituents(etf_symbol, api_key)
+        df = pd.read_csv(f"pages/data/{etf_symbol}_Holdings.csv")
+        save_to_csv(etf_symbol, df['Ticker'].tolist(), df['Weight'].tolist(), provider, workers=args.workers,
+                    rate=args.rate, retries=args.retries, backoff=args.backoff, refresh=args.refresh,
+                    cache_dir=args.cache_dir)
 
+if __name__ == "__main__":
+    main(sys.argv[1:])
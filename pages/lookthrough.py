@@ -0,0 +1,160 @@
+import os
+import re
+import glob
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from pages.constituent_data import load_holdings
+
+# Look-through of portfolios of ETFs to the securities the ETFs hold. The holdings of every ETF with a
+# '{etf}_Holdings.csv' are laid out once as a sparse ETF x security matrix of weights (fraction of the ETF's NAV), so the
+# exposure of any number of portfolios is one sparse product: (portfolio x ETF weights) @ (ETF x security weights), and
+# their sector or industry exposure one more product with a sparse security x sector indicator matrix.
+
+HOLDINGS_DIR = './pages/data'
+HOLDINGS_FILE = re.compile(r'^([A-Z]+)_Holdings\.csv$')
+
+# Columns describing a security, taken from its first position. Tickers are local to an exchange (AAL is Anglo American
+# in BBIN and American Airlines in DFAC), so a security is identified by its ticker and name
+SECURITY_FIELDS = ['Ticker', 'Security Name', 'Sector', 'Industry']
+
+
+def list_holdings_etfs(holdings_dir=HOLDINGS_DIR):
+    """Tickers of the ETFs with a '{etf}_Holdings.csv', e.g. ['BBIN', 'DFAC', 'JEPI', ...]"""
+    names = (os.path.basename(path) for path in glob.glob(os.path.join(holdings_dir, '*_Holdings.csv')))
+    return sorted(match.group(1) for match in map(HOLDINGS_FILE.match, names) if match)
+
+
+def etf_ticker(ticker):
+    """Plain ticker of an ETF, e.g. 'JEPI' for 'JEPI US Equity' (Bloomberg style, as in the workbooks)"""
+    return str(ticker).split()[0]
+
+
+class LookThrough:
+    """Weights of every ETF in the securities it holds
+
+    Attributes:
+        etfs (list of str): ETF tickers, row of each ETF in weights
+        securities (pandas df): One row per security held by any ETF ('Ticker', 'Security Name', 'Sector', 'Industry'),
+            column of each security in weights. Positions without a ticker (e.g. some bonds) have their name as ticker
+        weights (scipy csr matrix): ETF x security weights, as a fraction of the ETF's NAV (0.0176 for 1.76%)
+    """
+
+    def __init__(self, etfs, securities, weights):
+        self.etfs = etfs
+        self.securities = securities
+        self.weights = weights
+        self._groups = {}
+
+    @classmethod
+    def build(cls, etfs=None):
+        """Build the matrix from the holdings CSVs of some ETFs
+
+        Args:
+            etfs (list of str): ETF tickers, every ETF with a holdings file by default
+
+        Returns:
+            LookThrough
+        """
+        etfs = list_holdings_etfs() if etfs is None else etfs
+        frames = [load_holdings(etf).assign(etf_id=etf_id) for etf_id, etf in enumerate(etfs)]
+        positions = pd.concat(frames, ignore_index=True).dropna(subset=['Weight'])
+        positions['Ticker'] = positions['Ticker'].fillna(positions['Security Name'])
+
+        securities = positions.drop_duplicates(['Ticker', 'Security Name'])[SECURITY_FIELDS].reset_index(drop=True)
+        keys = pd.MultiIndex.from_frame(securities[['Ticker', 'Security Name']])
+        security_ids = keys.get_indexer(pd.MultiIndex.from_frame(positions[['Ticker', 'Security Name']]))
+        # Positions of the same security in an ETF (e.g. several lots) are summed by the conversion to CSR
+        weights = sparse.coo_matrix(
+            (positions['Weight'].to_numpy() / 100, (positions['etf_id'].to_numpy(), security_ids)),
+            shape=(len(etfs), len(securities)),
+        ).tocsr()
+        return cls(etfs, securities, weights)
+
+    def portfolio_matrix(self, portfolios):
+        """Sparse portfolio x ETF matrix of weights, only over the ETFs that can be looked through
+
+        Args:
+            portfolios (dict): Name -> pandas df of 'Ticker' and 'Weight' of the ETFs held, e.g. the sheets of
+                'Client ETF Holdings.xlsx'. Tickers may be plain ('QQQ') or Bloomberg style ('QQQ US Equity')
+
+        Returns:
+            Tuple of the scipy csr matrix and a pandas df of the 'Weight' of each portfolio and its 'Looked Through'
+            weight (held in ETFs with holdings), indexed by portfolio name
+        """
+        names = list(portfolios)
+        lengths = [len(holdings) for holdings in portfolios.values()]
+        tickers = np.concatenate([holdings['Ticker'].to_numpy(dtype=object) for holdings in portfolios.values()] + [[]])
+        weights = np.concatenate([holdings['Weight'].to_numpy(dtype=float) for holdings in portfolios.values()] + [[]])
+        rows = np.repeat(np.arange(len(names)), lengths)
+        etf_ids = pd.Index(self.etfs).get_indexer([etf_ticker(ticker) for ticker in tickers])
+        known = etf_ids >= 0
+
+        matrix = sparse.coo_matrix(
+            (weights[known], (rows[known], etf_ids[known])), shape=(len(names), len(self.etfs))
+        ).tocsr()
+        coverage = pd.DataFrame({
+            'Weight': np.bincount(rows, weights, minlength=len(names)),
+            'Looked Through': np.asarray(matrix.sum(axis=1)).ravel(),
+        }, index=names)
+        return matrix, coverage
+
+    def group_matrix(self, by):
+        """Sparse security x group indicator matrix and the group names, e.g. by='Sector'"""
+        if by not in self._groups:
+            codes, names = pd.factorize(self.securities[by].fillna('Unknown'), sort=True)
+            indicator = sparse.csr_matrix(
+                (np.ones(len(codes)), (np.arange(len(codes)), codes)), shape=(len(codes), len(names))
+            )
+            self._groups[by] = (indicator, list(names))
+        return self._groups[by]
+
+    def security_exposure(self, portfolios, top=None):
+        """Exposure of portfolios to the underlying securities
+
+        Args:
+            portfolios (dict): See portfolio_matrix
+            top (int): Keep only the largest exposures of each portfolio, all by default
+
+        Returns:
+            pandas df of 'Portfolio', SECURITY_FIELDS and 'Exposure' (in the unit of the portfolio weights), one row per
+            security held by each portfolio, largest first within each portfolio
+        """
+        matrix, _ = self.portfolio_matrix(portfolios)
+        exposure = (matrix @ self.weights).tocoo()
+        df = self.securities.iloc[exposure.col].reset_index(drop=True)
+        df.insert(0, 'Portfolio', np.array(list(portfolios), dtype=object)[exposure.row])
+        df['Exposure'] = exposure.data
+        df = df.sort_values(['Portfolio', 'Exposure'], ascending=[True, False], kind='stable')
+        if top is not None:
+            df = df.groupby('Portfolio', sort=False).head(top)
+        return df.reset_index(drop=True)
+
+    def group_exposure(self, portfolios, by='Sector'):
+        """Exposure of portfolios to the sectors (or industries) of the underlying securities
+
+        Args:
+            portfolios (dict): See portfolio_matrix
+            by (str): 'Sector' or 'Industry'
+
+        Returns:
+            pandas df of portfolio (rows) x group (columns) exposures, in the unit of the portfolio weights
+        """
+        matrix, _ = self.portfolio_matrix(portfolios)
+        indicator, names = self.group_matrix(by)
+        return pd.DataFrame((matrix @ self.weights @ indicator).toarray(), index=list(portfolios), columns=names)
+
+    def etf_group_weights(self, by='Sector'):
+        """ETF x group (e.g. sector) matrix of weights, as a fraction of each ETF's NAV"""
+        indicator, names = self.group_matrix(by)
+        return pd.DataFrame((self.weights @ indicator).toarray(), index=self.etfs, columns=names)
+
+
+_lookthrough = None  # LookThrough of every ETF with holdings, built on first use
+
+
+def get_lookthrough():
+    global _lookthrough
+    if _lookthrough is None:
+        _lookthrough = LookThrough.build()
+    return _lookthrough
@@ -0,0 +1,122 @@
+import os
+import glob
+import hashlib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from pages.constituent_data import file_hash, CACHE_DIR
+from pages.lookthrough import LookThrough, list_holdings_etfs, HOLDINGS_DIR
+
+# Pairwise holdings overlap of the ETFs with a '{etf}_Holdings.csv' ("how much of JEPI is already in QQQ?"), for every
+# pair at once from the sparse ETF x security weights of the look-through (see lookthrough.py):
+#   - count overlap: number of securities held by both ETFs, B @ B.T with B the binary ETF x security matrix
+#   - weight overlap: sum over the common securities of the smaller of the two weights. The weights of a security are
+#     cut into layers between its distinct weights across ETFs, an ETF covering a layer if its weight reaches the top of
+#     it, so min(w_i, w_j) is the total width of the layers both ETFs cover and the overlap is L @ diag(width) @ L.T,
+#     with L the binary ETF x layer matrix
+# Both are saved under a stamp of the holdings files and only computed again when one of them changes.
+
+
+def holdings_stamp(etfs, holdings_dir=HOLDINGS_DIR):
+    """Identifier of the content of the holdings files of some ETFs"""
+    stamp = hashlib.sha256()
+    for etf in etfs:
+        stamp.update(f'{etf}:{file_hash(os.path.join(holdings_dir, f"{etf}_Holdings.csv"))};'.encode())
+    return stamp.hexdigest()[:16]
+
+
+def count_overlap(weights):
+    """Number of securities held by both ETFs of every pair
+
+    Args:
+        weights (scipy sparse matrix): ETF x security weights, e.g. LookThrough.weights
+
+    Returns:
+        numpy array of shape (number of ETFs, number of ETFs), the number of holdings of each ETF on the diagonal
+    """
+    held = (weights > 0).astype(np.int32)
+    return (held @ held.T).toarray()
+
+
+def weight_overlap(weights):
+    """Sum of the smaller weight of the securities held by both ETFs of every pair
+
+    Args:
+        weights (scipy sparse matrix): ETF x security weights, e.g. LookThrough.weights
+
+    Returns:
+        numpy array of shape (number of ETFs, number of ETFs), in the unit of the weights, the total weight of each ETF
+        on the diagonal
+    """
+    positions = sparse.csc_matrix(weights)
+    positions.eliminate_zeros()
+    security_ids = np.repeat(np.arange(positions.shape[1]), np.diff(positions.indptr))
+    etf_ids = positions.indices
+    values = positions.data
+
+    # Distinct weights of each security in increasing order are its layers, a layer is as wide as the gap to the
+    # previous one (the first from 0)
+    order = np.lexsort((values, security_ids))
+    layers = pd.DataFrame({'security_id': security_ids[order], 'weight': values[order]}).drop_duplicates()
+    widths = np.diff(layers['weight'].to_numpy(), prepend=0.0)
+    first = np.r_[True, np.diff(layers['security_id'].to_numpy()) != 0]
+    widths[first] = layers['weight'].to_numpy()[first]
+
+    # An ETF covers the layers of a security up to its own weight: the layer of its weight and all the ones below
+    layer_ids = pd.MultiIndex.from_frame(layers).get_indexer(
+        pd.MultiIndex.from_arrays([security_ids, values], names=['security_id', 'weight'])
+    )
+    layer_starts = np.flatnonzero(first)[np.searchsorted(layers['security_id'].to_numpy()[first], security_ids)]
+    counts = layer_ids - layer_starts + 1
+    covered = sparse.csr_matrix(
+        (np.ones(counts.sum()), (np.repeat(etf_ids, counts), np.repeat(layer_starts, counts) + _ranges(counts))),
+        shape=(positions.shape[0], len(layers)),
+    )
+    return (covered @ sparse.diags(widths) @ covered.T).toarray()
+
+
+def _ranges(counts):
+    """Concatenation of range(count) for every count"""
+    return np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+
+def load_overlap(etfs=None, cache_dir=CACHE_DIR):
+    """Weight and count overlap of every pair of ETFs with holdings, from the cache or computed (then saved)
+
+    Args:
+        etfs (list of str): ETF tickers, every ETF with a holdings file by default
+        cache_dir (str): Directory of the saved overlap
+
+    Returns:
+        Tuple of two pandas df indexed by ETF ticker on both axes: the weight overlap (in % of NAV) and the count
+        overlap (number of common securities)
+    """
+    etfs = list_holdings_etfs() if etfs is None else etfs
+    path = os.path.join(cache_dir, f'overlap.{holdings_stamp(etfs)}.pkl')
+    if os.path.exists(path):
+        return pd.read_pickle(path)
+
+    lookthrough = LookThrough.build(etfs)
+    overlap = (
+        pd.DataFrame(weight_overlap(lookthrough.weights) * 100, index=etfs, columns=etfs),
+        pd.DataFrame(count_overlap(lookthrough.weights), index=etfs, columns=etfs),
+    )
+    os.makedirs(cache_dir, exist_ok=True)
+    # Drop the overlap of previous versions of the files
+    for old_path in glob.glob(os.path.join(cache_dir, 'overlap.*.pkl')):
+        os.remove(old_path)
+    pd.to_pickle(overlap, path)
+    return overlap
+
+
+_overlap = {}  # Stamp of the holdings files -> result of load_overlap
+
+
+def get_overlap():
+    """load_overlap of every ETF with holdings, kept in memory until a holdings file changes"""
+    etfs = list_holdings_etfs()
+    stamp = holdings_stamp(etfs)
+    if stamp not in _overlap:
+        _overlap.clear()
+        _overlap[stamp] = load_overlap(etfs)
+    return _overlap[stamp]
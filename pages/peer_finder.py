@@ -0,0 +1,123 @@
+import re
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+# Nearest competitors of an ETF over every fund of the region sheets of Competitor Data_v2.xlsx. Each metric (every column
+# but the descriptive ones) is standardized across the whole universe, so that e.g. assets in millions do not outweigh an
+# expense ratio, and the funds are indexed in a KD-tree: the k most similar funds, by Euclidean distance over the
+# standardized metrics, are then a tree query instead of a distance to every fund. The metrics have extreme outliers (a
+# 3Y return of 52,000%), so they are centered on their median and scaled by their interquartile range rather than their
+# mean and standard deviation, and clipped, so that one outlier does not flatten every other fund. A missing metric is
+# taken at the median, adding nothing to distances.
+
+# Bound of a standardized metric, in interquartile ranges from the median
+CLIP = 5
+
+# Parent companies of the JPM ETFs, e.g. 'JPMorgan ETFs Ireland ICAV' or 'JP Morgan ETFs/USA'
+JPM_PARENT = re.compile(r"^JP ?Morgan", re.IGNORECASE)
+
+# Columns of a fund other than its metrics
+REGION_COLUMN = "Region"
+ASSET_CLASS_COLUMN = "Fund Asset Class Focus"
+
+
+def standardize(metrics):
+    """Robust standardization of every metric: (value - median) / interquartile range, clipped to +/- CLIP, NaN to 0
+
+    Args:
+        metrics (pandas df): Funds x metrics, numeric
+
+    Returns:
+        numpy array of the standardized metrics
+    """
+    values = metrics.to_numpy(dtype=float)
+    median = np.nanmedian(values, axis=0)
+    q1, q3 = np.nanpercentile(values, [25, 75], axis=0)
+    scale = np.where(q3 > q1, q3 - q1, 1.0)
+    standardized = np.clip((values - median) / scale, -CLIP, CLIP)
+    return np.nan_to_num(standardized, nan=0.0)
+
+
+class PeerFinder:
+    """KD-tree index of the standardized metrics of every fund
+
+    Attributes:
+        funds (pandas df): Ticker, Name, Region (sheet of the fund), asset class and Row (position in its sheet) of every fund
+        metrics (list of str): Metric columns
+        values (numpy array): Funds x metrics, standardized
+    """
+
+    def __init__(self, funds, metrics, values):
+        self.funds = funds
+        self.metrics = metrics
+        self.values = values
+        self.positions = pd.Series(np.arange(len(funds)), index=funds["Ticker"])
+        self._trees = {}  # (region, asset class) -> (KD-tree of the funds of the filter, their positions)
+
+    @classmethod
+    def build(cls, sheets, regions, excluded_columns):
+        """Index the funds of some sheets of the workbook
+
+        Args:
+            sheets (dict): Sheet name -> pandas df, e.g. read_workbook("./static/Competitor Data_v2.xlsx", sheet_name=None)
+            regions (list of str): Sheets of the funds, e.g. ["US Equity", "MM Equity", ...]
+            excluded_columns (list of str): Non quantitative columns, the other columns are the metrics
+        """
+        funds = []
+        for region in regions:
+            sheet = sheets[region]
+            funds.append(sheet.assign(**{REGION_COLUMN: region, "Row": np.arange(len(sheet))}))
+        funds = pd.concat(funds, ignore_index=True).drop_duplicates("Ticker", ignore_index=True)
+        metrics = [column for column in sheets[regions[0]].columns if column not in excluded_columns]
+        values = standardize(funds[metrics].apply(pd.to_numeric, errors="coerce"))
+        return cls(funds[["Ticker", "Name", "Parent Comp. Name", ASSET_CLASS_COLUMN, REGION_COLUMN, "Row"]], metrics, values)
+
+    def jpm_tickers(self):
+        return self.funds.loc[self.funds["Parent Comp. Name"].fillna("").str.contains(JPM_PARENT), "Ticker"].tolist()
+
+    def asset_classes(self):
+        return sorted(self.funds[ASSET_CLASS_COLUMN].dropna().unique())
+
+    def tree(self, region=None, asset_class=None):
+        """KD-tree of the funds of a region and asset class (None for all), built on first use"""
+        key = (region, asset_class)
+        if key not in self._trees:
+            keep = np.ones(len(self.funds), dtype=bool)
+            if region is not None:
+                keep &= (self.funds[REGION_COLUMN] == region).to_numpy()
+            if asset_class is not None:
+                keep &= (self.funds[ASSET_CLASS_COLUMN] == asset_class).to_numpy()
+            positions = np.flatnonzero(keep)
+            self._trees[key] = (cKDTree(self.values[positions]), positions)
+        return self._trees[key]
+
+    def nearest(self, ticker, k=5, region=None, asset_class=None):
+        """The k funds most similar to a fund
+
+        Args:
+            ticker (str): Ticker of the fund, e.g. 'JEPI US Equity'
+            k (int): Number of funds
+            region (str): Only funds of this region (sheet), all by default
+            asset_class (str): Only funds of this asset class, e.g. 'Equity', all by default
+
+        Returns:
+            pandas df of the funds (Ticker, Name, Region, asset class, Row) by increasing Distance, with the share (%) of
+            each metric in the squared distance. Empty if the ticker is unknown.
+        """
+        tree, positions = self.tree(region, asset_class)
+        if ticker not in self.positions.index or len(positions) == 0:
+            position, peers, distances = 0, np.empty(0, dtype=int), np.empty(0)
+        else:
+            position = self.positions[ticker]
+            # one more fund, the ETF itself is in the tree if it passes the filters
+            distances, ids = tree.query(self.values[position], k=min(k + 1, len(positions)))
+            distances, peers = np.atleast_1d(distances), positions[np.atleast_1d(ids)]
+            others = peers != position
+            peers, distances = peers[others][:k], distances[others][:k]
+
+        squared = (self.values[peers] - self.values[position]) ** 2
+        with np.errstate(invalid="ignore"):
+            shares = squared / squared.sum(axis=1, keepdims=True) * 100
+        contributions = pd.DataFrame(np.nan_to_num(shares), columns=self.metrics)
+        return pd.concat([self.funds.iloc[peers].reset_index(drop=True), contributions], axis=1).assign(Distance=distances)
@@ -0,0 +1,128 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from pages.price_store import PriceStore, get_price_store, data_version
+
+# Rolling risk and performance of every ETF with prices, against a benchmark ETF: alpha, beta, volatility, Sharpe ratio,
+# max drawdown and tracking error over a trailing window of trading days. Window sums of the returns, squared returns and
+# cross products come from differences of cumulative sums, so these analytics are O(1) per window whatever its length and
+# O(n) for a whole history, instead of refitting a regression on each window. The max drawdown needs the running peak of
+# each window and stays O(window) per window, vectorized over all windows. The results have the layout of the price
+# store, so they are charted like any price column.
+
+# Trading days of the trailing window (about 3 months) and per year
+ROLLING_WINDOW = 63
+TRADING_DAYS = 252
+
+# Columns of the analytics, alongside the price columns on the time-series chart
+ANALYTICS_COLUMNS = [
+    "Rolling Alpha (%)",
+    "Rolling Beta",
+    "Rolling Volatility (%)",
+    "Rolling Sharpe",
+    "Rolling Max Drawdown (%)",
+    "Rolling Tracking Error (%)",
+]
+
+# Price column the returns are computed from
+PRICE_COLUMN = "PX_LAST"
+
+
+def window_sums(values, window):
+    """Sum of each trailing window of `window` values, from the first full window on (O(1) per window)"""
+    cumulative = np.concatenate([[0.0], np.cumsum(values)])
+    return cumulative[window:] - cumulative[:-window]
+
+
+def daily_returns(dates, prices):
+    """Simple daily returns of a price series, missing prices left out
+
+    Returns:
+        Tuple of the dates of the returns (each from the previous available price) and the returns
+    """
+    present = ~np.isnan(prices)
+    dates, prices = dates[present], prices[present]
+    return dates[1:], prices[1:] / prices[:-1] - 1
+
+
+def rolling_analytics(dates, prices, benchmark_dates, benchmark_prices, window=ROLLING_WINDOW):
+    """Rolling analytics of one ETF against a benchmark, on the dates both have returns for
+
+    Alpha, volatility and tracking error are annualized, in %. The Sharpe ratio assumes a zero risk free rate. The max
+    drawdown of a window is the worst fall of a price of the window below the highest earlier price of the same window,
+    starting from the price before its first return.
+
+    Args:
+        dates, prices (numpy arrays): Ascending dates and prices of the ETF
+        benchmark_dates, benchmark_prices (numpy arrays): Ascending dates and prices of the benchmark
+        window (int): Number of returns in a window
+
+    Returns:
+        Tuple of the dates (end of each full window) and a dict of ANALYTICS_COLUMNS -> numpy array
+    """
+    return_dates, returns = daily_returns(dates, prices)
+    benchmark_return_dates, benchmark_returns = daily_returns(benchmark_dates, benchmark_prices)
+    common, ids, benchmark_ids = np.intersect1d(return_dates, benchmark_return_dates, assume_unique=True, return_indices=True)
+    if len(common) < window:
+        return common[:0], {column: np.empty(0) for column in ANALYTICS_COLUMNS}
+    r, b = returns[ids], benchmark_returns[benchmark_ids]
+    d = r - b
+
+    n = window
+    sum_r, sum_b, sum_d = window_sums(r, n), window_sums(b, n), window_sums(d, n)
+    # Sample (co)variances from the window sums, clipped at 0 against rounding
+    var_r = np.maximum(window_sums(r * r, n) - sum_r ** 2 / n, 0) / (n - 1)
+    var_b = np.maximum(window_sums(b * b, n) - sum_b ** 2 / n, 0) / (n - 1)
+    var_d = np.maximum(window_sums(d * d, n) - sum_d ** 2 / n, 0) / (n - 1)
+    cov_rb = (window_sums(r * b, n) - sum_r * sum_b / n) / (n - 1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        beta = np.where(var_b > 0, cov_rb / var_b, np.nan)
+        alpha = (sum_r - beta * sum_b) / n * TRADING_DAYS * 100
+        volatility = np.sqrt(var_r * TRADING_DAYS) * 100
+        sharpe = np.where(var_r > 0, sum_r / n / np.sqrt(var_r) * np.sqrt(TRADING_DAYS), np.nan)
+        tracking_error = np.sqrt(var_d * TRADING_DAYS) * 100
+
+    # Drawdown of each window from the highest price since the start of that window, not of any earlier day: one row per
+    # window, the start price (before the first return) then the price after each return, with the running max
+    # accumulated along the row. Return i goes from price i to price i + 1 of the available prices.
+    present = prices[~np.isnan(prices)]
+    windows = np.column_stack([present[ids[:len(ids) - n + 1]], sliding_window_view(present[ids + 1], n)])
+    max_drawdown = (windows / np.maximum.accumulate(windows, axis=1) - 1).min(axis=1) * 100
+
+    return common[n - 1:], dict(zip(ANALYTICS_COLUMNS, [alpha, beta, volatility, sharpe, max_drawdown, tracking_error]))
+
+
+def build_analytics(store, benchmark, window=ROLLING_WINDOW):
+    """Rolling analytics of every ETF of a price store against one of them
+
+    Args:
+        store (PriceStore): Prices, e.g. get_price_store()
+        benchmark (str): Ticker of the benchmark, e.g. 'QQQ US Equity'
+        window (int): Number of returns in a window
+
+    Returns:
+        PriceStore of the ANALYTICS_COLUMNS of every ETF with prices
+    """
+    benchmark_dates, benchmark_prices = store.dates[benchmark], store.prices[benchmark][PRICE_COLUMN]
+    dates, analytics = {}, {}
+    for ticker in store.dates:
+        if PRICE_COLUMN in store.prices[ticker]:
+            dates[ticker], analytics[ticker] = rolling_analytics(
+                store.dates[ticker], store.prices[ticker][PRICE_COLUMN], benchmark_dates, benchmark_prices, window
+            )
+    return PriceStore(dates, analytics)
+
+
+_analytics = {}  # (data version of the prices, benchmark, window) -> result of build_analytics
+
+
+def get_analytics(benchmark, window=ROLLING_WINDOW):
+    """build_analytics of the price store, computed once per benchmark and window until the price files change"""
+    store = get_price_store()
+    key = (data_version(), benchmark, window)
+    if key not in _analytics:
+        # Results of previous versions of the files are dropped
+        for old_key in [old_key for old_key in _analytics if old_key[0] != key[0]]:
+            del _analytics[old_key]
+        _analytics[key] = build_analytics(store, benchmark, window)
+    return _analytics[key]
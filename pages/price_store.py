@@ -0,0 +1,142 @@
+import os
+import glob
+import hashlib
+import numpy as np
+import pandas as pd
+
+# Daily prices of the ETFs in 'price data', loaded once into date sorted NumPy arrays. The files come in two schemas:
+# Bloomberg exports (FUND_NET_ASSET_VAL, PX_LAST... with m/d/Y dates, newest first, and a trailing summary row) and
+# yfinance downloads (Open, High, Low... with timezone aware timestamps). Both are normalized to one schema: Bloomberg
+# style column names and timezone naive trading dates. A (tickers, column, date range) query is then two binary searches
+# per ticker instead of a read and parse of its file.
+PRICE_DIR = './price data'
+
+# yfinance column -> column of the normalized schema, Bloomberg columns are kept as they are
+COLUMN_NAMES = {
+    "Open": "PX_OPEN",
+    "High": "PX_HIGH",
+    "Low": "PX_LOW",
+    "Close": "PX_LAST",
+    "Volume": "PX_VOLUME",
+    "Dividends": "DVD_CASH",
+    "Stock Splits": "STOCK_SPLITS",
+    "Capital Gains": "CAPITAL_GAINS",
+    "Returns": "DAY_RETURN",
+}
+
+
+def parse_dates(dates):
+    """Trading dates of a Date column in either schema ('11/3/2023' or '2023-11-27 00:00:00-05:00'), NaT if unparseable
+
+    Returns:
+        numpy array of datetime64[D]
+    """
+    dates = dates.astype(str)
+    timestamps = pd.to_datetime(dates.str[:10], format="%Y-%m-%d", errors="coerce")
+    # Bloomberg dates are m/d/Y; the time and offset of yfinance timestamps are dropped, keeping the exchange's date
+    bloomberg = timestamps.isna()
+    timestamps[bloomberg] = pd.to_datetime(dates[bloomberg], format="%m/%d/%Y", errors="coerce")
+    return timestamps.to_numpy().astype("datetime64[D]")
+
+
+def load_prices(path):
+    """Read a price file into the normalized schema
+
+    Returns:
+        Tuple of the dates (numpy datetime64[D], ascending, unique) and a dict of column -> numpy float array
+    """
+    df = pd.read_csv(path)
+    dates = parse_dates(df.pop("Date"))
+    df = df.rename(columns=COLUMN_NAMES).apply(pd.to_numeric, errors="coerce")
+
+    valid = ~np.isnat(dates)
+    order = np.argsort(dates[valid], kind="stable")
+    dates, df = dates[valid][order], df[valid].iloc[order]
+    # Keep the last row of a date listed twice
+    last = np.r_[dates[1:] != dates[:-1], True]
+    return dates[last], {column: df[column].to_numpy(dtype=float)[last] for column in df.columns}
+
+
+class PriceStore:
+    """Prices of every ETF with a file in the price directory
+
+    Attributes:
+        dates (dict): Ticker (e.g. 'JEPI US Equity') -> ascending numpy array of datetime64[D]
+        prices (dict): Ticker -> dict of column -> numpy float array aligned with its dates
+        columns (list of str): Columns of the normalized schema available for at least one ticker
+    """
+
+    def __init__(self, dates, prices):
+        self.dates = dates
+        self.prices = prices
+        self.columns = sorted({column for columns in prices.values() for column in columns})
+
+    @classmethod
+    def load(cls, price_dir=PRICE_DIR):
+        dates, prices = {}, {}
+        for path in sorted(glob.glob(os.path.join(price_dir, "*.csv"))):
+            ticker = os.path.splitext(os.path.basename(path))[0]
+            dates[ticker], prices[ticker] = load_prices(path)
+        return cls(dates, prices)
+
+    def window(self, tickers, column, start=None, end=None):
+        """Prices of some tickers in a date range
+
+        Args:
+            tickers (list of str): Tickers, those without prices or without the column are left out
+            column (str): Column of the normalized schema, e.g. 'PX_LAST'
+            start (str or datetime64): First date, the first date of each ticker by default
+            end (str or datetime64): Last date, the last date of each ticker by default
+
+        Returns:
+            dict of ticker -> (dates, values) numpy arrays, ascending dates
+        """
+        start = None if start is None else np.datetime64(start, "D")
+        end = None if end is None else np.datetime64(end, "D")
+        window = {}
+        for ticker in tickers:
+            if column not in self.prices.get(ticker, {}):
+                continue
+            dates = self.dates[ticker]
+            first = 0 if start is None else np.searchsorted(dates, start, side="left")
+            last = len(dates) if end is None else np.searchsorted(dates, end, side="right")
+            window[ticker] = (dates[first:last], self.prices[ticker][column][first:last])
+        return window
+
+    def last_days(self, tickers, column, days):
+        """Prices of some tickers over the same calendar span: the `days` days up to the latest date of any of them
+
+        Args:
+            tickers (list of str): Tickers, those without prices or without the column are left out
+            column (str): Column of the normalized schema, e.g. 'PX_LAST'
+            days (int): Number of calendar days, e.g. 365 for 1 year
+
+        Returns:
+            dict of ticker -> (dates, values) numpy arrays, ascending dates
+        """
+        ends = [self.dates[ticker][-1] for ticker in tickers if column in self.prices.get(ticker, {})]
+        if not ends:
+            return {}
+        end = max(ends)
+        return self.window(tickers, column, start=end - np.timedelta64(days - 1, "D"), end=end)
+
+
+def data_version(price_dir=PRICE_DIR):
+    """Identifier of the price files (names, sizes and modification times), changes whenever a file is replaced"""
+    stamp = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(price_dir, "*.csv"))):
+        stat = os.stat(path)
+        stamp.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return stamp.hexdigest()[:16]
+
+
+_price_store = None  # (data version, PriceStore of every price file), loaded on first use
+
+
+def get_price_store():
+    """PriceStore of every price file, loaded again when the files change"""
+    global _price_store
+    version = data_version()
+    if _price_store is None or _price_store[0] != version:
+        _price_store = (version, PriceStore.load())
+    return _price_store[1]
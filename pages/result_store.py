@@ -0,0 +1,46 @@
+import uuid
+from pages.search_cache import SearchCache
+
+# Keyword search results stay on the server: the browser only receives a handle and fetches the rows it displays, one
+# page at a time. Results are persisted so every worker process can serve the pages of a search run by another one.
+RESULT_DIR = './pages/data/cache/results'
+_results = SearchCache(max_size=64, path=RESULT_DIR)
+
+
+def save_result(result):
+    """Store a search result on the server
+
+    Args:
+        result (dict): ETF ticker -> pandas df of its constituents' similarity
+
+    Returns:
+        Handle (str) to pass to load_result
+    """
+    handle = uuid.uuid4().hex
+    _results.put(handle, result)
+    return handle
+
+
+def load_result(handle):
+    """Search result of a handle, None if it expired (evicted from the store)"""
+    return _results.get(handle)
+
+
+def get_rows(df, start_row, end_row, sort_model=None):
+    """Rows of a page of a sorted DataFrame, in the format of the AG Grid infinite row model
+
+    Args:
+        df (pandas df): Full result
+        start_row (int): First row of the page
+        end_row (int): Row after the last row of the page
+        sort_model (list of dict): AG Grid sort model, e.g. [{"colId": "Weights", "sort": "desc"}]
+
+    Returns:
+        dict of 'rowData' (records of the page) and 'rowCount' (total number of rows)
+    """
+    if sort_model:
+        df = df.sort_values(
+            by=[sort['colId'] for sort in sort_model],
+            ascending=[sort['sort'] == 'asc' for sort in sort_model],
+        )
+    return {'rowData': df.iloc[start_row:end_row].to_dict('records'), 'rowCount': len(df)}
@@ -0,0 +1,156 @@
+import os
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+import diskcache
+
+
+def normalize_keyword(keyword):
+    """Lower case and collapse whitespace so that 'Clean  Energy ' and 'clean energy' share a cache entry"""
+    return ' '.join(str(keyword).lower().split())
+
+
+class SearchCache:
+    """Bounded LRU cache of keyword search results with optional persistence to disk
+
+    Entries are keyed on (normalized keyword, ticker set, data version, ...). A new data version (e.g. a regenerated
+    constituents file) produces new keys, so stale results are never returned and simply age out of the cache.
+
+    Searches run in background job processes (see dashboard.py), so the hit/miss counters of a persisted cache are kept
+    next to its entries, in a diskcache shared by every process, rather than in the memory of one of them.
+
+    Attributes:
+        hits (int): Number of lookups answered from memory or disk, by every process if persisted
+        misses (int): Number of lookups which had to be computed, by every process if persisted
+    """
+
+    def __init__(self, max_size=256, path=None):
+        """
+        Args:
+            max_size (int): Maximum number of entries kept in memory, and on disk if persisted
+            path (str): Directory where entries are persisted, None to only keep them in memory
+        """
+        self.max_size = max_size
+        self.path = path
+        self._counts = {'hits': 0, 'misses': 0}
+        self._shared_counts = diskcache.Cache(os.path.join(path, 'stats')) if path is not None else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(keyword, tickers, version, *extra):
+        """Cache key of a search: the order and duplicates of the tickers do not matter"""
+        return (normalize_keyword(keyword), tuple(sorted(set(tickers))), version) + tuple(extra)
+
+    def _file(self, key):
+        return os.path.join(self.path, hashlib.sha256(repr(key).encode()).hexdigest() + '.pkl')
+
+    def _read_disk(self, key):
+        if self.path is None:
+            return None
+        try:
+            with open(self._file(key), 'rb') as file:
+                stored_key, value = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if stored_key != key:
+            return None
+        try:
+            # Marks the entry as used, eviction goes by modification time
+            os.utime(self._file(key))
+        except OSError:
+            pass
+        return value
+
+    def _write_disk(self, key, value):
+        os.makedirs(self.path, exist_ok=True)
+        # Write to a temporary file first so a concurrent reader never sees a half written entry
+        tmp_file = f'{self._file(key)}.{os.getpid()}.tmp'
+        with open(tmp_file, 'wb') as file:
+            pickle.dump((key, value), file)
+        os.replace(tmp_file, self._file(key))
+
+        files = [os.path.join(self.path, name) for name in os.listdir(self.path) if name.endswith('.pkl')]
+        if len(files) > self.max_size:
+            # Least recently written or read entries are evicted first
+            for old_file in sorted(files, key=os.path.getmtime)[:len(files) - self.max_size]:
+                try:
+                    os.remove(old_file)
+                except OSError:
+                    pass
+
+    def _count(self, name):
+        if self._shared_counts is not None:
+            # atomic across processes
+            self._shared_counts.incr(name)
+        else:
+            self._counts[name] += 1
+
+    @property
+    def hits(self):
+        return self._shared_counts.get('hits', 0) if self._shared_counts is not None else self._counts['hits']
+
+    @property
+    def misses(self):
+        return self._shared_counts.get('misses', 0) if self._shared_counts is not None else self._counts['misses']
+
+    def get(self, key):
+        """Cached value of a key, or None on a miss"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._count('hits')
+                return self._entries[key]
+
+        value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self._count('misses')
+                return None
+            self._count('hits')
+            self._store(key, value)
+        return value
+
+    def _store(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def put(self, key, value):
+        with self._lock:
+            self._store(key, value)
+        if self.path is not None:
+            self._write_disk(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counts = {'hits': 0, 'misses': 0}
+            if self._shared_counts is not None:
+                self._shared_counts.clear()
+        if self.path is not None and os.path.isdir(self.path):
+            for name in os.listdir(self.path):
+                if name.endswith('.pkl'):
+                    os.remove(os.path.join(self.path, name))
+
+    def _disk_size(self):
+        if not os.path.isdir(self.path):
+            return 0
+        return sum(name.endswith('.pkl') for name in os.listdir(self.path))
+
+    def stats(self):
+        """Hit/miss counters for monitoring"""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+            lookups = hits + misses
+            return {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': hits / lookups if lookups else 0.0,
+                # entries on disk are those of every process
+                'size': self._disk_size() if self.path is not None else len(self._entries),
+                'max_size': self.max_size,
+                'persisted': self.path is not None,
+            }
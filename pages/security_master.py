@@ -0,0 +1,282 @@
+import os
+import glob
+import hashlib
+import numpy as np
+import pandas as pd
+from pages.constituent_data import load_constituents, file_hash, constituents_path, PREPROCESS_VERSION, CACHE_DIR
+from pages.constituent_index import list_constituent_etfs
+
+# The same securities (AAPL, MSFT, AMZN...) are held by many ETFs. The security master keeps one row per unique symbol
+# (description, sector, industry, embedding) and the holdings as an integer coded long table of
+# (etf_id, security_id, weight), so descriptions are stored, tokenized and embedded once per security instead of once per
+# position. Both are derived from the preprocessed constituents (see constituent_data.py) and saved under a stamp of the
+# constituents files.
+#
+# When a constituents file is regenerated the master is updated rather than rebuilt: every security has a fingerprint
+# of its fields, securities keep their id, only added or changed securities are re-embedded, and securities no longer
+# held by any ETF are tombstoned (kept with their id and embedding, but never searched) instead of removed.
+
+# Fields of a security, the same in every ETF holding it
+SECURITY_COLUMNS = ['Symbol', 'Company', 'Description', 'Sector', 'Industry', 'Clean Description']
+
+# Bumped whenever what is saved for a master changes, so masters of an older format are not read (v2: tombstones)
+MASTER_VERSION = 2
+
+# Embedding matrix of the securities, one row per security
+EMBEDDING_DIR = './pages/data/embeddings'
+EMBEDDING_FILE = 'securities.npz'
+
+
+def source_stamp(etfs):
+    """Identifier of the constituents files (content) and of the preprocessing they went through
+
+    Args:
+        etfs (list of str): ETF tickers
+
+    Returns:
+        str
+    """
+    stamp = hashlib.sha256(f'v{PREPROCESS_VERSION};'.encode())
+    for etf in etfs:
+        stamp.update(f'{etf}:{file_hash(constituents_path(etf))};'.encode())
+    return stamp.hexdigest()[:16]
+
+
+def fingerprint(values):
+    """Fingerprint of each row of a DataFrame (or of each value of a Series), changes whenever one of its values changes
+
+    Returns:
+        numpy array of str
+    """
+    rows = values.to_frame() if isinstance(values, pd.Series) else values
+    return np.array([hashlib.sha256('\x1f'.join(map(str, row)).encode()).hexdigest()[:16]
+                     for row in rows.itertuples(index=False)], dtype=str)
+
+
+def model_name(model):
+    """Identifier of an embedding model saved with the embeddings, e.g. 'CompactEmbeddings:300'"""
+    return f'{type(model).__name__}:{model.get_dimension()}'
+
+
+class SecurityMaster:
+    """Unique securities of all ETFs and the positions of each ETF in them
+
+    Attributes:
+        etfs (list of str): ETF tickers, the etf_id of an ETF is its position in the list
+        securities (pandas df): One row per symbol ever held (SECURITY_COLUMNS and 'Tombstone', True for securities no
+            longer held by any ETF), the security_id of a security is its row number
+        holdings (pandas df): One row per position, in the order of the constituents files: 'etf_id' (int16),
+            'security_id' (int32) and 'weight' (float32, in %, NaN if missing)
+        valid (numpy array): Whether each security is searched: held by an ETF and with all of its fields
+        stamp (str): Stamp of the constituents files the master was built from
+        changes (dict): Number of securities 'added', 'changed', 'unchanged', 'tombstoned' and 'restored' by the update
+            which built the master, None if it was loaded as is
+        vectors (numpy array): Unit length embedding of each security (zeros if not embedded), None until loaded
+    """
+
+    def __init__(self, etfs, securities, holdings, stamp, changes=None):
+        self.etfs = etfs
+        self.securities = securities
+        self.holdings = holdings
+        self.stamp = stamp
+        self.changes = changes
+        self.valid = securities[SECURITY_COLUMNS].notna().all(axis=1).to_numpy() & ~securities['Tombstone'].to_numpy()
+        self.vectors = None
+
+        # Positions of ETF e are holdings rows offsets[e]:offsets[e + 1] (the holdings are grouped by ETF)
+        self.offsets = np.searchsorted(holdings['etf_id'].to_numpy(), np.arange(len(etfs) + 1))
+        self._etf_ids = {etf: etf_id for etf_id, etf in enumerate(etfs)}
+        self._constituents = {}
+
+    @classmethod
+    def build(cls, etfs=None, previous=None):
+        """Build the master from the preprocessed constituents of some ETFs
+
+        Args:
+            etfs (list of str): ETF tickers, every ETF with a constituents file by default
+            previous (SecurityMaster): Master of the previous version of the files, its securities keep their id
+
+        Returns:
+            SecurityMaster
+        """
+        etfs = list_constituent_etfs() if etfs is None else etfs
+
+        frames = []
+        for etf_id, etf in enumerate(etfs):
+            source_df = load_constituents(etf).dropna(subset=['Symbol'])
+            frames.append(source_df.assign(etf_id=etf_id))
+        positions = pd.concat(frames, ignore_index=True)
+
+        # One row per symbol, taken from the position with the most fields present (a symbol missing its description
+        # in one file gets it from another)
+        completeness = positions[SECURITY_COLUMNS].notna().sum(axis=1)
+        best = positions.assign(completeness=completeness).sort_values('completeness', ascending=False, kind='stable')
+        latest = best.drop_duplicates('Symbol')[SECURITY_COLUMNS].sort_values('Symbol').reset_index(drop=True)
+
+        if previous is None:
+            securities = latest.assign(Tombstone=False)
+            changes = {'added': len(latest), 'changed': 0, 'unchanged': 0, 'tombstoned': 0, 'restored': 0}
+        else:
+            securities, changes = cls._merge(previous.securities, latest)
+
+        security_ids = pd.Series(np.arange(len(securities)), index=securities['Symbol'])
+        holdings = pd.DataFrame({
+            'etf_id': positions['etf_id'].to_numpy(dtype=np.int16),
+            'security_id': security_ids[positions['Symbol']].to_numpy(dtype=np.int32),
+            'weight': positions['Weights'].to_numpy(dtype=np.float32),
+        })
+        return cls(etfs, securities, holdings, source_stamp(etfs), changes)
+
+    @staticmethod
+    def _merge(previous, latest):
+        """Apply the latest securities to the previous ones: same ids for known symbols, new ids appended, tombstones for
+        symbols no longer held
+
+        Returns:
+            Tuple of the securities DataFrame and the counts of changes
+        """
+        previous_ids = pd.Index(previous['Symbol'])
+        known = latest['Symbol'].isin(previous_ids).to_numpy()
+        ids = previous_ids.get_indexer(latest['Symbol'][known])
+
+        was_tombstoned = previous['Tombstone'].to_numpy()[ids]
+        changed = fingerprint(previous[SECURITY_COLUMNS].iloc[ids]) != fingerprint(latest[SECURITY_COLUMNS][known])
+
+        securities = previous.copy()
+        securities.loc[ids, SECURITY_COLUMNS] = latest[known].to_numpy()
+        securities['Tombstone'] = True
+        securities.loc[ids, 'Tombstone'] = False
+        securities = pd.concat([securities, latest[~known].assign(Tombstone=False)], ignore_index=True)
+
+        changes = {
+            'added': int((~known).sum()),
+            'changed': int(changed.sum()),
+            'unchanged': int((~changed).sum()),
+            'tombstoned': int((~previous['Tombstone'].to_numpy()).sum() - (~was_tombstoned).sum()),
+            'restored': int(was_tombstoned.sum()),
+        }
+        return securities, changes
+
+    @classmethod
+    def load(cls, etfs=None, cache_dir=CACHE_DIR):
+        """Load the master saved for the current constituents files, updating the previously saved master (or building a
+        new one) if there is none
+
+        Args:
+            etfs (list of str): ETF tickers, every ETF with a constituents file by default
+            cache_dir (str): Directory of the saved master
+
+        Returns:
+            SecurityMaster
+        """
+        etfs = list_constituent_etfs() if etfs is None else etfs
+        path = os.path.join(cache_dir, f'security_master.v{MASTER_VERSION}.{source_stamp(etfs)}.pkl')
+        if os.path.exists(path):
+            return cls(*pd.read_pickle(path))
+
+        old_paths = glob.glob(os.path.join(cache_dir, f'security_master.v{MASTER_VERSION}.*.pkl'))
+        previous = cls(*pd.read_pickle(max(old_paths, key=os.path.getmtime))) if old_paths else None
+        print('Updating security master' if previous else 'Building security master')
+        master = cls.build(etfs, previous)
+        print(', '.join(f'{count} {change}' for change, count in master.changes.items()) + ' securities')
+
+        os.makedirs(cache_dir, exist_ok=True)
+        # Drop the masters of previous versions of the files
+        for old_path in old_paths:
+            os.remove(old_path)
+        pd.to_pickle((master.etfs, master.securities, master.holdings, master.stamp), path)
+        return master
+
+    def embedding_keys(self):
+        """Fingerprint of the text embedded for each security, its embedding is reused as long as it does not change"""
+        return fingerprint(self.securities[['Symbol', 'Clean Description']])
+
+    def load_vectors(self, model, embedding_dir=EMBEDDING_DIR):
+        """Load the saved embedding matrix of the securities
+
+        Args:
+            model: Model the queries are embedded with, the matrix must have been built with the same model
+            embedding_dir (str): Directory of the saved matrix
+
+        Returns:
+            Whether the matrix holds the embedding of every searched security
+        """
+        path = os.path.join(embedding_dir, EMBEDDING_FILE)
+        if self.vectors is None and os.path.exists(path):
+            saved = np.load(path)
+            keys = self.embedding_keys()
+            # Embeddings of another model are not comparable with the queries, the matrix is rebuilt
+            if (str(saved['model']) == model_name(model) and len(saved['keys']) == len(keys)
+                    and (saved['keys'] == keys)[self.valid].all()):
+                self.vectors = saved['vectors']
+        return self.vectors is not None
+
+    def build_vectors(self, model, embedding_dir=EMBEDDING_DIR):
+        """Embed the description of every searched security and save the matrix, reusing the saved embeddings of the
+        securities whose description did not change
+
+        Vectors are normalised to unit length, so the cosine similarity with a normalised query is a plain dot product.
+
+        Args:
+            model: fastText model or CompactEmbeddings, anything with get_dimension and get_sentence_vector
+            embedding_dir (str): Directory of the saved matrix
+
+        Returns:
+            numpy array of shape (number of securities, model dimension)
+        """
+        keys = self.embedding_keys()
+        vectors = np.zeros((len(self.securities), model.get_dimension()), dtype=np.float32)
+        embedded = np.zeros(len(self.securities), dtype=bool)
+
+        path = os.path.join(embedding_dir, EMBEDDING_FILE)
+        if os.path.exists(path):
+            saved = np.load(path)
+            # Embeddings of another model are not comparable and are all recomputed
+            if str(saved['model']) == model_name(model):
+                saved_rows = {key: row for row, key in enumerate(saved['keys']) if saved['embedded'][row]}
+                reused = np.array([security_id for security_id, key in enumerate(keys) if key in saved_rows], dtype=int)
+                vectors[reused] = saved['vectors'][[saved_rows[key] for key in keys[reused]]]
+                embedded[reused] = True
+
+        missing = np.flatnonzero(self.valid & ~embedded)
+        print(f'{len(missing)} securities embedded, {int((self.valid & embedded).sum())} reused')
+        descriptions = self.securities['Clean Description']
+        for security_id in missing:
+            vector = model.get_sentence_vector(descriptions.iloc[security_id])
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                vectors[security_id] = vector / norm
+        embedded[missing] = True
+
+        os.makedirs(embedding_dir, exist_ok=True)
+        np.savez(path, vectors=vectors, keys=keys, embedded=embedded, model=model_name(model))
+        self.vectors = vectors
+        return vectors
+
+    def constituents(self, etf):
+        """Searchable positions of an ETF: valid securities with a weight, in the order of its constituents file
+
+        Args:
+            etf (str): ETF ticker, e.g. 'JEPI'
+
+        Returns:
+            Tuple of a pandas df of 'Symbol', 'Company', 'Description', 'Sector', 'Industry', 'Weights' and
+            'Clean Description' (the columns of load_constituents), and the security_id of each row
+        """
+        if etf not in self._constituents:
+            etf_id = self._etf_ids[etf]
+            positions = self.holdings.iloc[self.offsets[etf_id]:self.offsets[etf_id + 1]]
+            security_ids = positions['security_id'].to_numpy()
+            searchable = self.valid[security_ids] & positions['weight'].notna().to_numpy()
+            security_ids = security_ids[searchable]
+
+            constituents = self.securities[SECURITY_COLUMNS].iloc[security_ids].reset_index(drop=True)
+            constituents.insert(5, 'Weights', positions['weight'].to_numpy(dtype=np.float64)[searchable])
+            self._constituents[etf] = (constituents, security_ids)
+        return self._constituents[etf]
+
+    def etfs_holding(self):
+        """List of the ETF tickers holding each security, indexed by security_id"""
+        etfs = np.array(self.etfs, dtype=object)
+        holders = self.holdings.groupby('security_id')['etf_id'].agg(lambda etf_ids: list(dict.fromkeys(etfs[etf_ids])))
+        return holders.reindex(range(len(self.securities)))